@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import (
     OAuth2PasswordBearer,
     OAuth2PasswordRequestForm,
@@ -7,14 +7,29 @@ from fastapi.security import (
 )
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+import asyncio
+import math
 import os
 
-from app.models import UserCreate, UserLogin, UserUpdate
-from app.database import users_collection
-from app.email_service import send_verification_email, send_goodbye_email
-from app.blob_service import delete_user_folder
+from app.models import UserCreate, UserLogin, UserUpdate, TokenData
+from app.database import (
+    async_users_collection,
+    users_collection,
+    async_collection,
+    async_activity_collection,
+    async_files_collection,
+)
+from app.cache import TTLCache
+from app import revocation
+from app.rate_limit import get_limiter, parse_rate
+from app.email_service import verification_message, goodbye_message
+from app.email_outbox import queue_email
+from app.blob_service import delete_blobs, list_user_blobs
 
 router = APIRouter()
 
@@ -27,6 +42,37 @@ pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 bearer_scheme = HTTPBearer()
 
+# User records by username (per worker). Invalidated locally on profile
+# update / verification / deletion; other workers catch up within the TTL.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
+)
+
+# pbkdf2 is deliberately slow (tens of ms per call). Run it on a small
+# dedicated pool so it never stalls the event loop or starves the shared
+# threadpool; beyond PASSWORD_HASH_MAX_PENDING queued calls, shed load (503)
+# instead of letting every login's latency grow without bound.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+_hash_executor = ThreadPoolExecutor(PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_pending = 0
+
+# /auth/token attempts: "<hits>/<seconds>" token buckets per identifier
+# (slows guessing one account) and per client IP (slows spraying many)
+login_identifier_limiter = get_limiter(*parse_rate(os.getenv("LOGIN_RATE_LIMIT_PER_IDENTIFIER", "5/60")))
+
+# The per-IP bucket is off unless LOGIN_RATE_LIMIT_PER_IP is set: behind a
+# proxy that nobody told us about, every caller has the proxy's address and
+# would share one bucket
+LOGIN_RATE_LIMIT_PER_IP = os.getenv("LOGIN_RATE_LIMIT_PER_IP")
+login_ip_limiter = get_limiter(*parse_rate(LOGIN_RATE_LIMIT_PER_IP)) if LOGIN_RATE_LIMIT_PER_IP else None
+
+# Header in which the front end passes the caller's address, e.g.
+# X-Forwarded-For (its last entry, the one the front end appended, is used:
+# earlier ones come from the client). Unset: the connecting peer.
+CLIENT_IP_HEADER = os.getenv("LOGIN_CLIENT_IP_HEADER")
+
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -36,26 +82,84 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def authenticate_user(identifier: str, password: str):
-    user = users_collection.find_one(
+async def _run_hashing(fn, *args):
+    global _hash_pending
+    if _hash_pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(503, "Server busy, please retry", headers={"Retry-After": "1"})
+
+    _hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
+
+def client_ip(request: Request) -> str:
+    if CLIENT_IP_HEADER:
+        forwarded = request.headers.get(CLIENT_IP_HEADER, "").split(",")[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.client.host if request.client else "unknown"
+
+
+async def check_login_rate(request: Request, identifier: str):
+    """429 with Retry-After once either bucket is empty."""
+    checks = [(login_identifier_limiter, f"login:id:{identifier.strip().lower()}")]
+    if login_ip_limiter is not None:
+        checks.insert(0, (login_ip_limiter, f"login:ip:{client_ip(request)}"))
+
+    for limiter, key in checks:
+        retry_after = await limiter.hit(key)
+        if retry_after is not None:
+            raise HTTPException(
+                429,
+                "Too many login attempts, try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+async def authenticate_user(identifier: str, password: str):
+    user = await async_users_collection.find_one(
         {"$or": [{"username": identifier}, {"email": identifier}]}
     )
 
     if not user:
         return None
 
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password_async(password, user["hashed_password"]):
         return None
 
     return user
 
 
+def access_token_claims(user: dict) -> dict:
+    """Identity claims routes need, so they don't have to look the user up."""
+    return {
+        "sub": user["username"],
+        "uid": str(user["_id"]),    # this account, not just the name (see file_catalog)
+        "email": user.get("email"),
+        "is_verified": bool(user.get("is_verified")),
+    }
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + (
+    now = datetime.utcnow()
+    expire = now + (
         expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    to_encode.update({"exp": expire})
+    # jti / iat let logout and account deletion revoke tokens; iat only
+    # has whole seconds, iat_ms tells tokens of the same second apart
+    iat_ms = int((now - datetime(1970, 1, 1)).total_seconds() * 1000)
+    to_encode.update({"exp": expire, "iat": now, "iat_ms": iat_ms, "jti": uuid4().hex})
 
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
@@ -72,18 +176,63 @@ def create_email_token(email: str):
     )
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def decode_access_token(token: str) -> dict:
+    """
+    Validate an access token and return its claims. No database access:
+    revocation is checked against the worker's in-memory mirror. Email
+    verification tokens are rejected.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-
-        if username is None:
-            raise HTTPException(401, "Invalid token")
-
     except JWTError:
         raise HTTPException(401, "Invalid token")
 
-    user = users_collection.find_one({"username": username})
+    if not payload.get("sub") or payload.get("type") == "verification":
+        raise HTTPException(401, "Invalid token")
+
+    if revocation.is_revoked(payload):
+        raise HTTPException(401, "Token revoked")
+
+    return payload
+
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> TokenData:
+    payload = decode_access_token(token)
+    return TokenData(
+        username=payload["sub"],
+        email=payload.get("email"),
+        is_verified=payload.get("is_verified"),
+        account_id=payload.get("uid"),
+    )
+
+
+async def get_user(username: str):
+    user = user_cache.get(username)
+    if user is None:
+        user = await async_users_collection.find_one({"username": username})
+        if user:
+            user_cache.set(username, user)
+    return user
+
+
+def get_user_sync(username: str):
+    """get_user for plain `def` handlers (threadpool)."""
+    user = user_cache.get(username)
+    if user is None:
+        user = users_collection.find_one({"username": username})
+        if user:
+            user_cache.set(username, user)
+    return user
+
+
+def invalidate_user(username: str):
+    user_cache.delete(username)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    username = decode_access_token(token)["sub"]
+
+    user = await get_user(username)
 
     if not user:
         raise HTTPException(401, "User not found")
@@ -96,27 +245,31 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 # -------------------------------------------------
 @router.post("/users", status_code=201)
 async def register(user: UserCreate):
-    existing = users_collection.find_one(
+    existing = await async_users_collection.find_one(
         {"$or": [{"username": user.username}, {"email": user.email}]}
     )
 
     if existing:
         raise HTTPException(400, "Username or Email already registered")
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
 
-    users_collection.insert_one(
-        {
-            "username": user.username,
-            "email": user.email,
-            "hashed_password": hashed_password,
-            "is_verified": False,
-            "created_at": datetime.utcnow(),
-        }
-    )
+    try:
+        await async_users_collection.insert_one(
+            {
+                "username": user.username,
+                "email": user.email,
+                "hashed_password": hashed_password,
+                "is_verified": False,
+                "created_at": datetime.utcnow(),
+            }
+        )
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration (unique indexes)
+        raise HTTPException(400, "Username or Email already registered")
 
     token = create_email_token(user.email)
-    send_verification_email(user.email, token)
+    await queue_email(user.email, *verification_message(token), dedupe_key=f"verify:{user.email}")
 
     return {
         "message": "User registered successfully. Please verify email.",
@@ -138,14 +291,17 @@ async def verify_email(token: str):
         if not email:
             raise HTTPException(400, "Invalid email token")
 
-        result = users_collection.update_one(
+        user = await async_users_collection.find_one_and_update(
             {"email": email},
             {"$set": {"is_verified": True}},
+            projection={"username": 1},
         )
 
-        if result.matched_count == 0:
+        if user is None:
             raise HTTPException(404, "User not found")
 
+        invalidate_user(user["username"])
+
         return {"message": "Email verified. You may now log in."}
 
     except JWTError:
@@ -168,14 +324,17 @@ async def verify_email_manual(token: str):
         if not email:
             raise HTTPException(400, "Invalid email token")
 
-        result = users_collection.update_one(
+        user = await async_users_collection.find_one_and_update(
             {"email": email},
             {"$set": {"is_verified": True}},
+            projection={"username": 1},
         )
 
-        if result.matched_count == 0:
+        if user is None:
             raise HTTPException(404, "User not found")
 
+        invalidate_user(user["username"])
+
         return {"message": "Email verified manually.", "email": email}
 
     except JWTError:
@@ -186,8 +345,10 @@ async def verify_email_manual(token: str):
 # LOGIN
 # -------------------------------------------------
 @router.post("/token")
-async def login(form: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form.username, form.password)
+async def login(request: Request, form: OAuth2PasswordRequestForm = Depends()):
+    await check_login_rate(request, form.username)
+
+    user = await authenticate_user(form.username, form.password)
 
     if not user:
         raise HTTPException(400, "Incorrect username or password")
@@ -195,7 +356,8 @@ async def login(form: OAuth2PasswordRequestForm = Depends()):
     if not user.get("is_verified"):
         raise HTTPException(403, "Email not verified")
 
-    token = create_access_token({"sub": user["username"]})
+    user_cache.set(user["username"], user)
+    token = create_access_token(access_token_claims(user))
 
     return {"access_token": token, "token_type": "bearer"}
 
@@ -205,11 +367,8 @@ async def login(form: OAuth2PasswordRequestForm = Depends()):
 # -------------------------------------------------
 @router.get("/auth/verify-token")
 async def verify_token(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return {"valid": True, "user": payload.get("sub")}
-    except:
-        raise HTTPException(401, "Invalid token")
+    payload = decode_access_token(token)
+    return {"valid": True, "user": payload.get("sub")}
 
 
 # -------------------------------------------------
@@ -223,29 +382,53 @@ async def update_profile(update: UserUpdate, current_user=Depends(get_current_us
         data["name"] = update.name
 
     if update.email:
-        exists = users_collection.find_one({"email": update.email})
+        exists = await async_users_collection.find_one({"email": update.email})
         if exists and exists["username"] != current_user["username"]:
             raise HTTPException(400, "Email already in use")
         data["email"] = update.email
 
     if update.password:
-        data["hashed_password"] = get_password_hash(update.password)
+        data["hashed_password"] = await get_password_hash_async(update.password)
+
+    if not data:
+        return {"message": "Profile updated successfully"}
 
-    if data:
-        users_collection.update_one(
-            {"username": current_user["username"]},
-            {"$set": data},
+    await async_users_collection.update_one(
+        {"username": current_user["username"]},
+        {"$set": data},
+    )
+    invalidate_user(current_user["username"])
+
+    response = {"message": "Profile updated successfully"}
+
+    # Tokens carry the email claim — hand out one that matches the profile
+    if "email" in data:
+        response["access_token"] = create_access_token(
+            access_token_claims({**current_user, **data})
         )
+        response["token_type"] = "bearer"
 
-    return {"message": "Profile updated successfully"}
+    return response
 
 
 # -------------------------------------------------
 # LOGOUT
 # -------------------------------------------------
 @router.post("/logout")
-async def logout(_: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
-    return {"message": "Logout successful (client must delete token)"}
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    payload = decode_access_token(credentials.credentials)
+
+    if payload.get("jti"):
+        await revocation.revoke_token(
+            payload["jti"], datetime.utcfromtimestamp(payload["exp"])
+        )
+    else:
+        # tokens issued before jti existed can only be revoked per user
+        await revocation.revoke_user(
+            payload["sub"], timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+
+    return {"message": "Logout successful"}
 
 
 # -------------------------------------------------
@@ -256,12 +439,60 @@ async def delete_account(current_user=Depends(get_current_user)):
     username = current_user["username"]
     email = current_user["email"]
 
-    result = users_collection.delete_one({"username": username})
+    # Listed while the name is still taken: a new account registered under
+    # it during the purge keeps its own uploads
+    blob_names = await list_user_blobs(f"{username}/")
+
+    result = await async_users_collection.delete_one({"username": username})
+    invalidate_user(username)
 
     if result.deleted_count == 0:
         raise HTTPException(404, "User not found")
 
-    delete_user_folder(username)
-    send_goodbye_email(email)
+    await revocation.revoke_user(
+        username, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+    # Files and history can take a while for heavy users: finish in the
+    # background so the request returns as soon as the account is gone
+    task = asyncio.create_task(purge_account_data(username, email, datetime.utcnow(), blob_names))
+    _purge_tasks.add(task)
+    task.add_done_callback(_purge_tasks.discard)
 
-    return {"message": "Account and all files deleted successfully.", "status": "success"}
+    return {"message": "Account deleted. Your files are being removed.", "status": "success"}
+
+
+# Keeps running purges referenced until they finish
+_purge_tasks = set()
+
+
+async def purge_account_data(username: str, email: str, deleted_at: datetime, blob_names: list):
+    """
+    Remove a deleted account's blobs (`blob_names`, listed before the user
+    record went) and Mongo documents, then say goodbye. Documents created
+    after `deleted_at` (a new account reusing the name) are left alone.
+    """
+    before = {"$not": {"$gt": deleted_at}}
+    try:
+        blobs, results, activity, files = await asyncio.gather(
+            delete_blobs(blob_names),
+            async_collection.delete_many({"username": username, "timestamp": before}),
+            async_activity_collection.delete_many({"username": username, "timestamp": before}),
+            async_files_collection.delete_many({"username": username, "$or": [
+                {"kind": {"$ne": "content"}, "uploaded_at": before},
+                # content records have created_at instead
+                {"kind": "content", "created_at": before},
+            ]}),
+        )
+        print(
+            f"Purged account {username}: {blobs} blobs, "
+            f"{results.deleted_count} results, {activity.deleted_count} activity logs, "
+            f"{files.deleted_count} file records"
+        )
+    except Exception as e:
+        print(f"Purging account {username} failed:", e)
+
+    try:
+        await queue_email(email, *goodbye_message(), dedupe_key=f"goodbye:{username}")
+    except Exception as e:
+        print("Goodbye email failed:", e)
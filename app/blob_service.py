@@ -1,72 +1,514 @@
-from azure.storage.blob import BlobServiceClient, BlobSasPermissions, generate_blob_sas
+"""
+Blob storage for uploads and reports. Every call is async.
+
+BLOB_BACKEND selects the store:
+    azure   Azure Blob Storage (default). Also works against Azurite — point
+            AZURE_STORAGE_CONNECTION_STRING at it.
+    local   plain files under BLOB_LOCAL_ROOT, for running and benchmarking
+            the API offline.
+
+Large blobs are moved in blocks / ranges of BLOB_CHUNK_SIZE bytes, up to
+BLOB_MAX_CONCURRENCY of them in flight per transfer.
+
+upload_bytes(..., compress=True) encodes the blob with BLOB_COMPRESSION
+(gzip, zstd or none) chunk by chunk while it is uploaded, and records the
+codec in the blob's metadata; downloads decode it transparently. Only use
+it for blobs the API reads back itself — SAS links hand out raw bytes.
+"""
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+from anyio import from_thread
+import asyncio
+import io
+import json
 import os
+import zlib
 load_dotenv()
 
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "azure")
+
 AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_CONTAINER = os.getenv("AZURE_CONTAINER_NAME")
 
-if not AZURE_CONNECTION_STRING:
-    raise ValueError("AZURE_STORAGE_CONNECTION_STRING is missing")
+BLOB_LOCAL_ROOT = os.getenv("BLOB_LOCAL_ROOT", "./blobs")
+
+# Transfer tuning
+BLOB_MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", str(4 * 1024 * 1024)))
+# Blobs up to this size go up / come down in a single request
+BLOB_SINGLE_SHOT_SIZE = int(os.getenv("BLOB_SINGLE_SHOT_SIZE", str(8 * 1024 * 1024)))
+
+# Blob batch API limit per request
+DELETE_BATCH_SIZE = 256
+
+# Codec for upload_bytes(..., compress=True): none | gzip | zstd
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "none")
+BLOB_COMPRESSION_LEVEL = os.getenv("BLOB_COMPRESSION_LEVEL")
+
+# Metadata key carrying the codec
+ENCODING_KEY = "encoding"
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+# -------------------------------------------------
+# AZURE (async SDK)
+# -------------------------------------------------
+class AzureBlobBackend:
+    # SAS URLs let clients fetch blobs without going through the app
+    direct_urls = True
+
+    def __init__(self, connection_string: str, container: str):
+        from azure.core.exceptions import ResourceNotFoundError
+        from azure.storage.blob.aio import BlobServiceClient
+
+        if not connection_string:
+            raise ValueError("AZURE_STORAGE_CONNECTION_STRING is missing")
+
+        self._not_found = ResourceNotFoundError
+        self.container = container
+        self.service_client = BlobServiceClient.from_connection_string(
+            connection_string,
+            max_single_put_size=BLOB_SINGLE_SHOT_SIZE,
+            max_block_size=BLOB_CHUNK_SIZE,
+            max_single_get_size=BLOB_SINGLE_SHOT_SIZE,
+            max_chunk_get_size=BLOB_CHUNK_SIZE,
+        )
+        self.container_client = self.service_client.get_container_client(container)
+
+    async def upload(self, data, blob_name: str, metadata: dict):
+        """`data` is bytes or an async iterator of byte chunks."""
+        await self.container_client.upload_blob(
+            name=blob_name,
+            data=data,
+            overwrite=True,
+            metadata=metadata or None,
+            max_concurrency=BLOB_MAX_CONCURRENCY,
+        )
+
+    async def _downloader(self, blob_name: str, offset=None, length=None):
+        try:
+            return await self.container_client.download_blob(
+                blob_name, offset=offset, length=length, max_concurrency=BLOB_MAX_CONCURRENCY
+            )
+        except self._not_found:
+            raise BlobNotFound(blob_name)
+
+    async def download_bytes(self, blob_name: str):
+        downloader = await self._downloader(blob_name)
+        return downloader.properties.metadata or {}, await downloader.readall()
+
+    async def download_stream(self, blob_name: str, offset=None, length=None):
+        downloader = await self._downloader(blob_name, offset, length)
+        return downloader.properties.metadata or {}, downloader.chunks()
+
+    async def get_blob_properties(self, blob_name: str) -> dict:
+        try:
+            props = await self.container_client.get_blob_client(blob_name).get_blob_properties()
+        except self._not_found:
+            raise BlobNotFound(blob_name)
+        return {"size": props.size, "last_modified": props.last_modified, "metadata": props.metadata or {}}
+
+    async def delete_blob(self, blob_name: str):
+        try:
+            await self.container_client.delete_blob(blob_name)
+        except self._not_found:
+            raise BlobNotFound(blob_name)
+        return True
+
+    async def delete_batch(self, blob_names: list) -> int:
+        responses = await self.container_client.delete_blobs(*blob_names, raise_on_any_failure=False)
+        return sum([1 async for r in responses if r.status_code == 202])
+
+    async def list_user_blobs(self, prefix: str):
+        return [b.name async for b in self.container_client.list_blobs(name_starts_with=prefix)]
+
+    def generate_report_sas(self, blob_name: str, expiry_minutes: int = 60, filename: str = None):
+        from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+        sas = generate_blob_sas(
+            account_name=self.service_client.account_name,
+            container_name=self.container,
+            blob_name=blob_name,
+            account_key=self.service_client.credential.account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.utcnow() + timedelta(minutes=expiry_minutes),
+            content_disposition=f"attachment; filename={filename}" if filename else None,
+        )
+        return f"{self.container_client.get_blob_client(blob_name).url}?{sas}"
+
+    async def close(self):
+        await self.service_client.close()
+
+
+# -------------------------------------------------
+# LOCAL FILESYSTEM
+# -------------------------------------------------
+class LocalBlobBackend:
+    # file:// URLs are only meaningful on this machine
+    direct_urls = False
+
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, blob_name: str) -> Path:
+        path = (self.root / blob_name).resolve()
+        if self.root not in path.parents:
+            raise BlobNotFound(blob_name)
+        return path
+
+    # metadata lives in a "<blob>.meta" JSON file next to the blob
+    def _meta_path(self, path: Path) -> Path:
+        return path.with_name(path.name + ".meta")
+
+    def _read_meta(self, path: Path) -> dict:
+        try:
+            return json.loads(self._meta_path(path).read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _open_for_write(self, blob_name: str):
+        path = self._path(blob_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path, open(path.with_name(path.name + ".part"), "wb")
+
+    def _commit(self, path: Path, handle, metadata: dict):
+        handle.close()
+        meta_path = self._meta_path(path)
+        if metadata:
+            meta_path.write_text(json.dumps(metadata))
+        else:
+            meta_path.unlink(missing_ok=True)
+        Path(handle.name).replace(path)
+
+    def _read(self, blob_name: str):
+        path = self._path(blob_name)
+        try:
+            return self._read_meta(path), path.read_bytes()
+        except (FileNotFoundError, IsADirectoryError):
+            raise BlobNotFound(blob_name)
+
+    def _open(self, blob_name: str):
+        try:
+            return open(self._path(blob_name), "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            raise BlobNotFound(blob_name)
+
+    def _stat(self, blob_name: str) -> dict:
+        path = self._path(blob_name)
+        if not path.is_file():
+            raise BlobNotFound(blob_name)
+        stat = path.stat()
+        return {
+            "size": stat.st_size,
+            "last_modified": datetime.utcfromtimestamp(stat.st_mtime),
+            "metadata": self._read_meta(path),
+        }
+
+    def _unlink(self, blob_name: str):
+        path = self._path(blob_name)
+        try:
+            path.unlink()
+        except (FileNotFoundError, IsADirectoryError):
+            raise BlobNotFound(blob_name)
+        self._meta_path(path).unlink(missing_ok=True)
+
+        # drop emptied "folders", like a real container has none
+        for parent in path.parents:
+            if parent == self.root:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    def _list(self, prefix: str):
+        # only walk the deepest directory the prefix names
+        base = self.root / prefix.rsplit("/", 1)[0] if "/" in prefix else self.root
+        if not base.is_dir():
+            return []
+        names = (p.relative_to(self.root).as_posix() for p in base.rglob("*") if p.is_file())
+        return sorted(
+            n for n in names
+            if n.startswith(prefix) and not n.endswith(".part") and not n.endswith(".meta")
+        )
+
+    async def upload(self, data, blob_name: str, metadata: dict):
+        """`data` is bytes or an async iterator of byte chunks."""
+        path, handle = await run_in_threadpool(self._open_for_write, blob_name)
+        try:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                await run_in_threadpool(handle.write, data)
+            else:
+                async for chunk in data:
+                    await run_in_threadpool(handle.write, chunk)
+        except BaseException:
+            handle.close()
+            Path(handle.name).unlink(missing_ok=True)
+            raise
+        await run_in_threadpool(self._commit, path, handle, metadata)
+
+    async def download_bytes(self, blob_name: str):
+        return await run_in_threadpool(self._read, blob_name)
+
+    async def download_stream(self, blob_name: str, offset=None, length=None):
+        handle = await run_in_threadpool(self._open, blob_name)
+        metadata = await run_in_threadpool(self._read_meta, Path(handle.name))
+        if offset:
+            handle.seek(offset)
+
+        async def chunks():
+            remaining = length
+            try:
+                while remaining is None or remaining > 0:
+                    size = BLOB_CHUNK_SIZE if remaining is None else min(BLOB_CHUNK_SIZE, remaining)
+                    chunk = await run_in_threadpool(handle.read, size)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+            finally:
+                handle.close()
+
+        return metadata, chunks()
+
+    async def get_blob_properties(self, blob_name: str) -> dict:
+        return await run_in_threadpool(self._stat, blob_name)
+
+    async def delete_blob(self, blob_name: str):
+        await run_in_threadpool(self._unlink, blob_name)
+        return True
+
+    def _unlink_many(self, blob_names: list) -> int:
+        deleted = 0
+        for name in blob_names:
+            try:
+                self._unlink(name)
+                deleted += 1
+            except BlobNotFound:
+                pass
+        return deleted
+
+    async def delete_batch(self, blob_names: list) -> int:
+        return await run_in_threadpool(self._unlink_many, blob_names)
 
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-container_client = blob_service_client.get_container_client(AZURE_CONTAINER)
+    async def list_user_blobs(self, prefix: str):
+        return await run_in_threadpool(self._list, prefix)
 
-def upload_bytes(data: bytes, blob_name: str):
-    """Upload raw bytes to Azure Blob"""
-    container_client.upload_blob(name=blob_name, data=data, overwrite=True)
+    def generate_report_sas(self, blob_name: str, expiry_minutes: int = 60, filename: str = None):
+        return self._path(blob_name).as_uri()
+
+    async def close(self):
+        pass
+
+
+_backend = None
+
+
+def get_backend():
+    """Created on first use, so importing this module needs no credentials."""
+    global _backend
+    if _backend is None:
+        if BLOB_BACKEND == "local":
+            _backend = LocalBlobBackend(BLOB_LOCAL_ROOT)
+        else:
+            _backend = AzureBlobBackend(AZURE_CONNECTION_STRING, AZURE_CONTAINER)
+    return _backend
+
+
+# -------------------------------------------------
+# COMPRESSION
+# -------------------------------------------------
+def _compressor(encoding: str, level=None):
+    if encoding == "gzip":
+        return zlib.compressobj(int(level or 6), zlib.DEFLATED, 31)
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=int(level or 3)).compressobj()
+    raise ValueError(f"Unknown blob encoding: {encoding}")
+
+
+def _decompressor(encoding: str):
+    if encoding == "gzip":
+        return zlib.decompressobj(31)
+    if encoding == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown blob encoding: {encoding}")
+
+
+async def _encode(data: bytes, encoding: str):
+    """Compressed chunks of `data`, one BLOB_CHUNK_SIZE slice at a time."""
+    compressor = _compressor(encoding, BLOB_COMPRESSION_LEVEL)
+    view = memoryview(data)
+    for i in range(0, len(view), BLOB_CHUNK_SIZE):
+        out = await run_in_threadpool(compressor.compress, view[i:i + BLOB_CHUNK_SIZE])
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+async def _decode(chunks, encoding: str):
+    decompressor = _decompressor(encoding)
+    async for chunk in chunks:
+        out = await run_in_threadpool(decompressor.decompress, chunk)
+        if out:
+            yield out
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+async def _slice(chunks, offset: int, length=None):
+    """Bytes [offset, offset + length) of a chunk stream."""
+    async for chunk in chunks:
+        if offset >= len(chunk):
+            offset -= len(chunk)
+            continue
+        chunk, offset = chunk[offset:], 0
+        if length is not None:
+            chunk = chunk[:length]
+            length -= len(chunk)
+        yield chunk
+        if length == 0:
+            break
+
+
+def _decode_all(data: bytes, encoding: str) -> bytes:
+    decompressor = _decompressor(encoding)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+# -------------------------------------------------
+# PUBLIC API
+# -------------------------------------------------
+async def upload_bytes(data: bytes, blob_name: str, compress: bool = False):
+    """Upload bytes, encoded with BLOB_COMPRESSION if `compress`"""
+    encoding = BLOB_COMPRESSION if compress else "none"
+    if encoding == "none":
+        await get_backend().upload(data, blob_name, {})
+    else:
+        await get_backend().upload(_encode(data, encoding), blob_name, {ENCODING_KEY: encoding})
     return blob_name
 
 
-def download_bytes(blob_name: str) -> bytes:
-    """Download blob and return bytes"""
-    blob_client = container_client.get_blob_client(blob_name)
-    return blob_client.download_blob().readall()
+async def download_bytes(blob_name: str) -> bytes:
+    """
+    Download a whole blob (ranges fetched in parallel), decoded. Holds the
+    stored and the decoded copy at once: for large blobs that are parsed
+    rather than kept, read download_stream() through a BlobReader instead.
+    """
+    metadata, data = await get_backend().download_bytes(blob_name)
+    encoding = metadata.get(ENCODING_KEY)
+    if encoding:
+        data = await run_in_threadpool(_decode_all, data, encoding)
+    return data
+
+
+async def download_stream(blob_name: str, offset: int = None, length: int = None):
+    """
+    Open a blob (or `length` bytes of it from `offset`) for streaming.
+    Raises BlobNotFound up front; returns an async iterator of decoded
+    byte chunks.
+    """
+    backend = get_backend()
+    metadata, chunks = await backend.download_stream(blob_name, offset, length)
+    encoding = metadata.get(ENCODING_KEY)
+    if not encoding:
+        return chunks
+
+    if offset or length is not None:
+        # ranges of an encoded blob: decode from the start and cut
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+        _, chunks = await backend.download_stream(blob_name)
+        return _slice(_decode(chunks, encoding), offset or 0, length)
+    return _decode(chunks, encoding)
+
+
+class BlobReader(io.RawIOBase):
+    """
+    Blocking file object over download_stream()'s chunks, for parsers that
+    want a file (pandas.read_csv). Only usable from a worker thread started
+    with run_in_threadpool: each read pulls the next decoded chunk from the
+    event loop, so neither the stored nor the whole decoded blob is ever
+    held in memory.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self._pending = memoryview(b"")
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._done:
+            try:
+                self._pending = memoryview(from_thread.run(self._chunks.__anext__))
+            except StopAsyncIteration:
+                self._done = True
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
 
+async def get_blob_properties(blob_name: str) -> dict:
+    """{"size": stored bytes, "last_modified": datetime, "metadata": dict} without downloading"""
+    return await get_backend().get_blob_properties(blob_name)
 
-def delete_blob(blob_name: str):
+
+async def delete_blob(blob_name: str):
     """Delete a single blob"""
-    blob_client = container_client.get_blob_client(blob_name)
-    blob_client.delete_blob()
-    return True
+    return await get_backend().delete_blob(blob_name)
 
 
-def list_user_blobs(prefix: str):
-    """List blobs inside a folder"""
-    return [b.name for b in container_client.list_blobs(name_starts_with=prefix)]
-
-def generate_report_sas(blob_name: str, expiry_minutes: int = 60):
-    sas = generate_blob_sas(
-        account_name=blob_service_client.account_name,
-        container_name=AZURE_CONTAINER,
-        blob_name=blob_name,
-        account_key=blob_service_client.credential.account_key,
-        permission=BlobSasPermissions(read=True),
-        expiry=datetime.utcnow() + timedelta(minutes=expiry_minutes),
-    )
-
-    return (
-        f"https://{blob_service_client.account_name}.blob.core.windows.net/"
-        f"{AZURE_CONTAINER}/{blob_name}?{sas}"
-    )
-
-def delete_user_folder(username: str):
+async def delete_blobs(blob_names: list) -> int:
     """
-    Deletes all user files from Azure Blob Storage.
-    Example paths removed:
-        username/uploads/*
-        username/results/*
-        username/*
+    Delete many blobs, DELETE_BATCH_SIZE per request and up to
+    BLOB_MAX_CONCURRENCY requests at once. Missing blobs are skipped.
+    Returns how many were deleted.
     """
-    blobs = container_client.list_blobs(name_starts_with=f"{username}/")
+    backend = get_backend()
+    slots = asyncio.Semaphore(BLOB_MAX_CONCURRENCY)
+
+    async def run(batch):
+        async with slots:
+            return await backend.delete_batch(batch)
+
+    batches = [blob_names[i:i + DELETE_BATCH_SIZE] for i in range(0, len(blob_names), DELETE_BATCH_SIZE)]
+    return sum(await asyncio.gather(*(run(b) for b in batches)))
+
+
+async def list_user_blobs(prefix: str):
+    """List blobs inside a folder"""
+    return await get_backend().list_user_blobs(prefix)
+
+
+def generate_report_sas(blob_name: str, expiry_minutes: int = 60, filename: str = None):
+    """Time-limited read URL for a blob (downloads as `filename` if given)"""
+    return get_backend().generate_report_sas(blob_name, expiry_minutes, filename)
+
+
+def supports_direct_urls() -> bool:
+    """True if generate_report_sas() URLs are reachable by clients."""
+    return get_backend().direct_urls
+
 
-    deleted = 0
-    for blob in blobs:
-        container_client.delete_blob(blob.name)
-        deleted += 1
+async def close():
+    if _backend is not None:
+        await _backend.close()
 
-    return {"deleted_files": deleted, "status": "success"}
 
 if __name__ == "__main__":
-    print(f"Connected to Azure Storage: {blob_service_client.account_name}")
+    print(f"Blob backend: {type(get_backend()).__name__}")
@@ -0,0 +1,240 @@
+"""
+Pool of warm headless Chrome sessions for the Selenium scraper.
+
+Starting Chrome costs seconds and hundreds of MB, so browsers are kept
+between requests and shared by concurrent scrapes:
+
+    with browser() as driver:
+        driver.get(url)
+
+    - at most BROWSER_POOL_SIZE browsers per worker; callers beyond that wait
+      (up to BROWSER_ACQUIRE_TIMEOUT_SECONDS, then BrowserPoolTimeout)
+    - a browser is health-checked before it is handed out and replaced if
+      it has died
+    - a browser is retired after BROWSER_MAX_USES sessions, or straight away
+      if a session raised (its state is unknown)
+    - the chromedriver path is resolved once per process (CHROMEDRIVER_PATH
+      skips webdriver_manager entirely)
+    - BROWSER_BLOCK_RESOURCES (images,fonts,media by default; empty to turn
+      off) stops pages downloading what the scraper never reads
+
+Selenium is imported on first use so the API boots without it.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))
+ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT_SECONDS", "60"))
+PAGE_LOAD_TIMEOUT_SECONDS = int(os.getenv("BROWSER_PAGE_LOAD_TIMEOUT_SECONDS", "30"))
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH")
+
+# "eager": driver.get() returns at DOMContentLoaded; the scraper waits for
+# the elements it needs itself (see review_scraper._wait_for_reviews)
+PAGE_LOAD_STRATEGY = os.getenv("BROWSER_PAGE_LOAD_STRATEGY", "eager")
+
+BLOCK_RESOURCES = {r.strip() for r in os.getenv("BROWSER_BLOCK_RESOURCES", "images,fonts,media").split(",") if r.strip()}
+
+BLOCKED_URL_PATTERNS = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "media": ["*.mp4", "*.webm", "*.m3u8", "*.ts", "*.mp3", "*.m4a", "*.ogg"],
+}
+
+CHROME_ARGUMENTS = [
+    "--headless=new",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+]
+
+
+class BrowserPoolTimeout(Exception):
+    """No browser became free within the acquire timeout."""
+
+
+_driver_path: Optional[str] = None
+_driver_path_lock = threading.Lock()
+
+
+def driver_path() -> str:
+    """chromedriver location, downloaded / looked up once per process."""
+    global _driver_path
+    if _driver_path is None:
+        with _driver_path_lock:
+            if _driver_path is None:
+                if CHROMEDRIVER_PATH:
+                    _driver_path = CHROMEDRIVER_PATH
+                else:
+                    from webdriver_manager.chrome import ChromeDriverManager
+
+                    _driver_path = ChromeDriverManager().install()
+    return _driver_path
+
+
+def chrome_options():
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.page_load_strategy = PAGE_LOAD_STRATEGY
+    for argument in CHROME_ARGUMENTS:
+        options.add_argument(argument)
+    if "images" in BLOCK_RESOURCES:
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    return options
+
+
+def _block_resources(driver):
+    patterns = [p for kind in sorted(BLOCK_RESOURCES) for p in BLOCKED_URL_PATTERNS.get(kind, [])]
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        # blocking only saves bandwidth: scrape without it
+        print("Blocking browser resources failed:", e)
+
+
+def _start_browser():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    driver = webdriver.Chrome(service=Service(driver_path()), options=chrome_options())
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT_SECONDS)
+    _block_resources(driver)
+    return driver
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        print("Closing browser failed:", e)
+
+
+def _healthy(driver) -> bool:
+    try:
+        return driver.execute_script("return 1") == 1
+    except Exception:
+        return False
+
+
+def _reset(driver):
+    """Leave no cookies or page state for the next user."""
+    driver.delete_all_cookies()
+    driver.get("about:blank")
+
+
+class _Browser:
+    __slots__ = ("driver", "uses")
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class BrowserPool:
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = MAX_USES):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self._idle: List[_Browser] = []
+        self._open = 0      # idle + handed out + being started
+        self._waiting = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float = ACQUIRE_TIMEOUT_SECONDS) -> _Browser:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise BrowserPoolTimeout("browser pool is closed")
+                self._waiting += 1
+                try:
+                    while not self._idle and self._open >= self.size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise BrowserPoolTimeout(f"no browser free within {timeout:g}s")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+                if self._idle:
+                    # most recently used first: it is the warmest
+                    browser = self._idle.pop()
+                else:
+                    browser = None
+                    self._open += 1
+
+            if browser is None:
+                try:
+                    return _Browser(_start_browser())
+                except Exception:
+                    self._forget()
+                    raise
+
+            if _healthy(browser.driver):
+                return browser
+            _quit(browser.driver)
+            self._forget()
+
+    def release(self, browser: _Browser, broken: bool = False):
+        browser.uses += 1
+        if not broken and browser.uses < self.max_uses and not self._closed:
+            try:
+                _reset(browser.driver)
+            except Exception as e:
+                print("Resetting browser failed:", e)
+            else:
+                with self._cond:
+                    self._idle.append(browser)
+                    self._cond.notify()
+                return
+
+        _quit(browser.driver)
+        self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+            }
+
+    def close(self):
+        """Quit idle browsers; ones in use are quit when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for browser in idle:
+            _quit(browser.driver)
+
+
+pool = BrowserPool()
+
+
+@contextmanager
+def browser(timeout: float = ACQUIRE_TIMEOUT_SECONDS):
+    """Borrow a WebDriver from the pool for the duration of the block."""
+    leased = pool.acquire(timeout)
+    try:
+        yield leased.driver
+    except BaseException:
+        pool.release(leased, broken=True)
+        raise
+    else:
+        pool.release(leased)
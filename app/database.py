@@ -1,23 +1,258 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+import hashlib
 import os
+import threading
+import unicodedata
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(MONGO_URI)
+
+# Connection pool sizing (per worker process, per client)
+MONGO_POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "300000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+}
 
 DB_NAME = os.getenv("MONGO_DB_NAME", "sentiment_db")
-db = client[DB_NAME]
 
-collection = db["results"]  
 
-users_collection = db["users"]
+# -------------------------------------------------
+# CLIENTS (created on first use, so importing the app never touches Mongo)
+# -------------------------------------------------
+_client = None
+_async_client = None
+_collections = {}
+_clients_lock = threading.Lock()
+
+
+def get_client() -> MongoClient:
+    global _client
+    if _client is None:
+        with _clients_lock:
+            if _client is None:
+                _client = MongoClient(MONGO_URI, **MONGO_POOL_OPTIONS)
+    return _client
+
+
+def get_async_client():
+    """Motor client for `async def` handlers — never blocks the event loop."""
+    global _async_client
+    if _async_client is None:
+        with _clients_lock:
+            if _async_client is None:
+                from motor.motor_asyncio import AsyncIOMotorClient
+
+                _async_client = AsyncIOMotorClient(MONGO_URI, **MONGO_POOL_OPTIONS)
+    return _async_client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def get_async_db():
+    return get_async_client()[DB_NAME]
+
+
+def use_clients(client, async_client):
+    """Swap in other clients (e.g. mongomock in the benchmark stand-ins)."""
+    global _client, _async_client
+    with _clients_lock:
+        _client, _async_client = client, async_client
+        _collections.clear()
+
+
+def _collection(name: str, is_async: bool):
+    key = (name, is_async)
+    found = _collections.get(key)
+    if found is None:
+        found = _collections[key] = (get_async_db() if is_async else get_db())[name]
+    return found
+
+
+class LazyCollection:
+    """Module-level handle that resolves its collection on first use."""
+
+    def __init__(self, name: str, is_async: bool = False):
+        self._name = name
+        self._is_async = is_async
+
+    def __getattr__(self, attr):
+        return getattr(_collection(self._name, self._is_async), attr)
+
+    def __getitem__(self, key):
+        return _collection(self._name, self._is_async)[key]
+
+    def __repr__(self):
+        return f"LazyCollection({self._name!r}, is_async={self._is_async})"
+
+
+collection = LazyCollection("results")
+
+users_collection = LazyCollection("users")
+
+activity_collection = LazyCollection("activity_logs")
+
+performance_collection = LazyCollection("performance_logs")
+
+files_collection = LazyCollection("uploaded_files")
+
+
+# -------------------------------------------------
+# ASYNC COLLECTIONS
+# -------------------------------------------------
+async_collection = LazyCollection("results", is_async=True)
+
+async_users_collection = LazyCollection("users", is_async=True)
+
+async_activity_collection = LazyCollection("activity_logs", is_async=True)
+
+async_performance_collection = LazyCollection("performance_logs", is_async=True)
+
+async_files_collection = LazyCollection("uploaded_files", is_async=True)
+
+async_revoked_tokens_collection = LazyCollection("revoked_tokens", is_async=True)
+
+async_rate_limits_collection = LazyCollection("rate_limits", is_async=True)
+
+async_email_outbox_collection = LazyCollection("email_outbox", is_async=True)
+
+async_scrape_cache_collection = LazyCollection("scrape_cache", is_async=True)
+
+
+# -------------------------------------------------
+# INDEXES (created once at startup, see ensure_indexes)
+# -------------------------------------------------
+INDEXES = {
+    "results": [
+        # Duplicate detection claims (username, text_digest) atomically.
+        # Partial so legacy rows without a digest don't collide on null.
+        IndexModel(
+            [("username", ASCENDING), ("text_digest", ASCENDING)],
+            name="username_text_digest_unique",
+            unique=True,
+            partialFilterExpression={"text_digest": {"$exists": True}},
+        ),
+        # GET /analyses keyset pagination, newest first, optionally by label
+        IndexModel(
+            [("username", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="username_timestamp",
+        ),
+        IndexModel(
+            [("username", ASCENDING), ("label", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="username_label_timestamp",
+        ),
+    ],
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "uploaded_files": [
+        # Partial: content records ({"kind": "content"}) have no file_id
+        IndexModel(
+            [("file_id", ASCENDING)],
+            name="file_id_unique_partial",
+            unique=True,
+            partialFilterExpression={"file_id": {"$exists": True}},
+        ),
+        # Deduplicated upload content, one record per account and sha256
+        IndexModel(
+            [("username", ASCENDING), ("account", ASCENDING), ("sha256", ASCENDING)],
+            name="account_content_unique",
+            unique=True,
+            partialFilterExpression={"sha256": {"$exists": True}},
+        ),
+        # GET /files keyset pagination, newest first
+        IndexModel(
+            [("username", ASCENDING), ("uploaded_at", DESCENDING), ("_id", DESCENDING)],
+            name="username_uploaded_at",
+        ),
+    ],
+    "revoked_tokens": [
+        # Entries vanish once every token they could match has expired
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # Incremental refresh in each worker
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+    ],
+    "email_outbox": [
+        # Sender claims: due pending messages, expired leases
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease"),
+        # Dedupe: one undelivered message per key
+        IndexModel(
+            [("pending_key", ASCENDING)],
+            name="pending_key_unique",
+            unique=True,
+            partialFilterExpression={"pending_key": {"$exists": True}},
+        ),
+        # Delivered / failed messages are kept for a while, then dropped
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "scrape_cache": [
+        # Entries are dropped SCRAPE_CACHE_RETENTION_SECONDS after their last refresh
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        # Idle buckets are full again long before this; drop them
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=3600),
+    ],
+}
+
+
+async def ensure_indexes():
+    """
+    Create the indexes behind every hot lookup. create_indexes is a no-op for
+    indexes that already exist, so this is safe to run on every worker boot.
+    A failure (e.g. legacy duplicate emails blocking a unique index) is
+    reported but does not stop the app from starting.
+    """
+    async_db = get_async_db()
+    for name, models in INDEXES.items():
+        try:
+            await async_db[name].create_indexes(models)
+        except Exception as e:
+            print(f"Index creation failed on {name}:", e)
+
+
+# -------------------------------------------------
+# TEXT DIGESTS (duplicate detection key for results)
+# -------------------------------------------------
+def text_digest(text: str) -> str:
+    """sha256 of the NFKC-normalised, whitespace-collapsed text."""
+    normalized = " ".join(unicodedata.normalize("NFKC", str(text)).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
 
-activity_collection = db["activity_logs"]
+def backfill_text_digests(batch_size: int = 1000):
+    """
+    One-off migration: add text_digest to results stored before it existed.
+    Legacy duplicates of an already-digested text keep no digest (the unique
+    index would reject it) and are reported as skipped.
+    """
+    updated = skipped = 0
+    cursor = collection.find(
+        {"text_digest": {"$exists": False}},
+        {"_id": 1, "text": 1},
+        batch_size=batch_size,
+    )
 
-performance_collection = db["performance_logs"]
+    for doc in cursor:
+        try:
+            collection.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {"text_digest": text_digest(doc.get("text", ""))}},
+            )
+            updated += 1
+        except DuplicateKeyError:
+            skipped += 1
 
-files_collection = db["uploaded_files"]
+    return {"updated": updated, "skipped_duplicates": skipped}
 
 
+if __name__ == "__main__":
+    print("Backfilling text digests:", backfill_text_digests())
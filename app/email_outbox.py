@@ -0,0 +1,182 @@
+"""
+Email outbox: requests queue messages in the `email_outbox` collection and
+return; a background sender in every worker delivers them.
+
+    await queue_email(to, subject, body, dedupe_key="report:alice:<file_id>")
+
+Sending:
+    - messages are claimed atomically (status pending -> sending) with a
+      lease, so workers never send the same message twice; a worker that
+      dies mid-send leaves a lease that expires and the message is retried.
+      Each claim has its own token: a sender whose lease ran out cannot
+      overwrite a message another worker has claimed since
+    - up to EMAIL_SEND_CONCURRENCY sends in flight per worker, paced by the
+      EMAIL_RATE_LIMIT token bucket ("<messages>/<seconds>")
+    - failures retry with exponential backoff and jitter, up to
+      EMAIL_MAX_ATTEMPTS, then the message is marked failed
+    - a dedupe_key is held while the message is undelivered: queueing the
+      same key again is a no-op
+    - delivered and failed messages expire after EMAIL_RETENTION_DAYS
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+
+from app.database import async_email_outbox_collection
+from app.email_service import send_email
+from app.rate_limit import get_limiter, parse_rate
+
+SEND_CONCURRENCY = int(os.getenv("EMAIL_SEND_CONCURRENCY", "4"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+BACKOFF_BASE_SECONDS = float(os.getenv("EMAIL_BACKOFF_BASE_SECONDS", "5"))
+BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_BACKOFF_MAX_SECONDS", "600"))
+POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "5"))
+RETENTION = timedelta(days=int(os.getenv("EMAIL_RETENTION_DAYS", "7")))
+
+# A claimed message not finished within this is considered abandoned
+LEASE = timedelta(seconds=int(os.getenv("EMAIL_LEASE_SECONDS", "120")))
+
+send_limiter = get_limiter(*parse_rate(os.getenv("EMAIL_RATE_LIMIT", "10/1")))
+
+# Set by queue_email so this worker's sender starts without waiting a poll
+_wakeup: Optional[asyncio.Event] = None
+
+
+def _event() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+async def queue_email(to_email: str, subject: str, body: str, dedupe_key: Optional[str] = None) -> bool:
+    """Queue a message. False if `dedupe_key` is already waiting to be sent."""
+    now = datetime.utcnow()
+    doc = {
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    if dedupe_key:
+        # only held until delivery (see _finish), so the same email can be
+        # sent again later
+        doc["pending_key"] = dedupe_key
+
+    try:
+        await async_email_outbox_collection.insert_one(doc)
+    except DuplicateKeyError:
+        return False
+
+    _event().set()
+    return True
+
+
+def _backoff(attempts: int) -> timedelta:
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+async def _claim():
+    now = datetime.utcnow()
+    return await async_email_outbox_collection.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lte": now}},
+        ]},
+        {"$set": {"status": "sending", "lease_until": now + LEASE, "claim": uuid4().hex}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _finish(doc: dict, result: dict):
+    now = datetime.utcnow()
+    if result.get("status") == "sent":
+        update = {
+            "$set": {"status": "sent", "sent_at": now, "message_id": result.get("messageId"), "expires_at": now + RETENTION},
+            "$unset": {"pending_key": "", "lease_until": "", "claim": ""},
+        }
+    elif doc["attempts"] >= MAX_ATTEMPTS:
+        update = {
+            "$set": {"status": "failed", "error": result.get("error"), "expires_at": now + RETENTION},
+            "$unset": {"pending_key": "", "lease_until": "", "claim": ""},
+        }
+        print(f"Email to {doc['to']} failed after {doc['attempts']} attempts:", result.get("error"))
+    else:
+        update = {
+            "$set": {"status": "pending", "error": result.get("error"), "next_attempt_at": now + _backoff(doc["attempts"])},
+            "$unset": {"lease_until": "", "claim": ""},
+        }
+    finished = await async_email_outbox_collection.update_one(
+        {"_id": doc["_id"], "status": "sending", "claim": doc["claim"]}, update
+    )
+    if finished.matched_count == 0:
+        print(f"Email to {doc['to']}: lease expired before the send finished, result dropped")
+
+
+async def _deliver(doc: dict):
+    while True:
+        retry_after = await send_limiter.hit("email:send")
+        if retry_after is None:
+            break
+        await asyncio.sleep(retry_after)
+
+    try:
+        result = await run_in_threadpool(send_email, doc["to"], doc["subject"], doc["body"])
+    except Exception as e:
+        result = {"status": "failed", "error": str(e)}
+    await _finish(doc, result)
+
+
+async def drain() -> int:
+    """Send everything that is due, SEND_CONCURRENCY at a time. Returns how many were attempted."""
+    slots = asyncio.Semaphore(SEND_CONCURRENCY)
+    in_flight = set()
+    attempted = 0
+
+    async def run(doc):
+        try:
+            await _deliver(doc)
+        finally:
+            slots.release()
+
+    while True:
+        await slots.acquire()
+        doc = await _claim()
+        if doc is None:
+            slots.release()
+            break
+        task = asyncio.create_task(run(doc))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        attempted += 1
+
+    if in_flight:
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    return attempted
+
+
+async def run_sender():
+    """Background task started from the app lifespan."""
+    wakeup = _event()
+    while True:
+        wakeup.clear()
+        try:
+            await drain()
+        except Exception as e:
+            print("Email outbox drain failed:", e)
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
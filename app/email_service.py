@@ -1,12 +1,36 @@
-from azure.communication.email import EmailClient
+"""
+Email transport and message templates.
+
+Requests never call this directly: they queue messages in the outbox
+(app/email_outbox.py), whose background sender calls send_email().
+
+EMAIL_BACKEND selects the transport:
+    azure   Azure Communication Services (default)
+    sink    keep messages in `sent_messages` (tests, local runs, benchmarks)
+"""
 import os
 from urllib.parse import quote
 
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "azure")
+
 conn_str = os.getenv("AZURE_COMM_EMAIL_CONNECTION_STRING")
 sender = os.getenv("AZURE_COMM_SENDER_ADDRESS")
 APP_BASE_URL = os.getenv("APP_BASE_URL")
 
-client = EmailClient.from_connection_string(conn_str)
+# Everything "sent" through the sink backend
+sent_messages = []
+
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        from azure.communication.email import EmailClient
+
+        _client = EmailClient.from_connection_string(conn_str)
+    return _client
+
 
 def send_azure_email(to_email: str, subject: str, body: str):
     message = {
@@ -19,7 +43,7 @@ def send_azure_email(to_email: str, subject: str, body: str):
     }
 
     try:
-        poller = client.begin_send(message)
+        poller = _get_client().begin_send(message)
         result = poller.result()
         message_id = result.get("id") or result.get("messageId")
         return {"status": "sent", "messageId": message_id}
@@ -29,7 +53,22 @@ def send_azure_email(to_email: str, subject: str, body: str):
         return {"status": "failed", "error": str(e)}
 
 
-def send_verification_email(to_email: str, token: str):
+def send_sink_email(to_email: str, subject: str, body: str):
+    sent_messages.append({"to": to_email, "subject": subject, "body": body})
+    return {"status": "sent", "messageId": f"sink-{len(sent_messages)}"}
+
+
+def send_email(to_email: str, subject: str, body: str):
+    """Blocking send through the configured backend."""
+    if EMAIL_BACKEND == "sink":
+        return send_sink_email(to_email, subject, body)
+    return send_azure_email(to_email, subject, body)
+
+
+# -------------------------------------------------
+# MESSAGES  (subject, body)
+# -------------------------------------------------
+def verification_message(token: str):
     subject = "Verify Your Email Address"
     token_encoded = quote(token)
 
@@ -53,12 +92,10 @@ Thank you for registering!
 Sentiment Analysis Cloud Platform
 """
 
-    return send_azure_email(
-        to_email=to_email,
-        subject=subject,
-        body=body
-    )
-def send_goodbye_email(to_email: str):
+    return subject, body
+
+
+def goodbye_message():
     subject = "Your Account Has Been Deleted"
 
     body = f"""
@@ -73,8 +110,8 @@ Regards,
 Cloud Sentiment Platform Team
 """
 
-    return send_azure_email(
-        to_email=to_email,
-        subject=subject,
-        body=body
-    )
+    return subject, body
+
+
+def report_ready_message(report_url: str):
+    return "Sentiment Report Ready", f"Your report is ready.\nDownload: {report_url}"
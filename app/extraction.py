@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-import pandas as pd
+from starlette.concurrency import run_in_threadpool
+from urllib.parse import urlencode
 import io
-import requests
-from bs4 import BeautifulSoup
 import re
 import os
 
 API_KEY = os.getenv("SCRAPER_API_KEY")
+SCRAPER_API_URL = "http://api.scraperapi.com/"
 
-from app.auth import oauth2_scheme, jwt, SECRET_KEY, ALGORITHM
+# ScraperAPI renders through proxies and is much slower than a direct fetch
+SCRAPER_API_TIMEOUT_SECONDS = float(os.getenv("SCRAPER_API_TIMEOUT_SECONDS", "60"))
+
+from app.auth import oauth2_scheme, decode_access_token
+from app.http_client import FetchError
+from app.scrape_cache import cached_reviews, get_many, get_text
+from app.html_extract import PROFILES, SiteProfile, extract_generic, extract_reviews
+from app.review_scraper import SCRAPER_MAX_PAGES, page_urls, past_last_page
 
 
 router = APIRouter()
@@ -19,80 +26,72 @@ router = APIRouter()
 # JWT TOKEN VALIDATION
 # ---------------------------------------------------------
 def verify_token(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            raise HTTPException(401, "Invalid token")
-        return username
-    except:
-        raise HTTPException(401, "Invalid token")
-
-
-# ---------------------------------------------------------
-# HELPER: CLEAN TEXT
-# ---------------------------------------------------------
-def clean(text):
-    if not text:
-        return ""
-    return " ".join(text.strip().split())
+    return decode_access_token(token)["sub"]
 
 
 # ---------------------------------------------------------
 # 1️⃣ GENERIC REVIEW SCRAPER
 # ---------------------------------------------------------
-def extract_generic_reviews(url: str):
-    try:
-        resp = requests.get(url, headers={"User-Agent": "Mozilla/5.0"})
-        soup = BeautifulSoup(resp.text, "html.parser")
-    except Exception:
-        return []
+async def extract_generic_reviews(url: str):
+    return await cached_reviews(url, "generic", lambda: _extract_generic_reviews(url))
 
-    possible_tags = ["review", "comment", "feedback", "testimonial"]
-    reviews = []
 
-    for tag in soup.find_all(text=True):
-        lower = tag.lower()
-        if any(keyword in lower for keyword in possible_tags):
-            cleaned = clean(tag)
-            if len(cleaned.split()) > 3:
-                reviews.append(cleaned)
-
-    return list(set(reviews))
+async def _extract_generic_reviews(url: str):
+    html = await get_text(url)
+    return await run_in_threadpool(extract_generic, html)
 
 
 # ---------------------------------------------------------
 # 2️⃣ AMAZON REVIEW SCRAPER
 # ---------------------------------------------------------
-def extract_amazon_reviews(url: str):
-    api_url = f"http://api.scraperapi.com/?api_key={API_KEY}&url={url}"
-
-    resp = requests.get(api_url)
-    soup = BeautifulSoup(resp.text, "html.parser")
+async def _scrape_pages_via_api(url: str, max_pages: int, profile: SiteProfile, **api_params):
+    """
+    Fetch every known page through ScraperAPI at once; stop at the first
+    empty one. Raises FetchError if a page could not be fetched.
+    """
+    api_urls = [
+        f"{SCRAPER_API_URL}?{urlencode({'api_key': API_KEY, **api_params, 'url': page})}"
+        for page in page_urls(url, max_pages)
+    ]
+    pages = await get_many(api_urls, timeout=SCRAPER_API_TIMEOUT_SECONDS)
 
-    review_blocks = soup.find_all("span", {"data-hook": "review-body"})
-    return [clean(r.text) for r in review_blocks]
+    reviews = []
+    for done, html in enumerate(pages):
+        if isinstance(html, FetchError):
+            if past_last_page(html, done):
+                break
+            raise html
+        found = await run_in_threadpool(extract_reviews, html, None, profile)
+        if not found:
+            break
+        reviews.extend(found)
+    return reviews
+
+
+async def extract_amazon_reviews(url: str, max_pages: int = 1):
+    return await cached_reviews(
+        url, f"scraperapi:amazon:{max_pages}",
+        lambda: _scrape_pages_via_api(url, max_pages, PROFILES["amazon"]),
+    )
 
 
 
 # ---------------------------------------------------------
 # 3️⃣ FLIPKART SCRAPER
 # ---------------------------------------------------------
-def extract_flipkart_reviews(url: str):
-    api_url = f"http://api.scraperapi.com/?api_key={API_KEY}&country=IN&url={url}"
-
-    resp = requests.get(api_url)
-    soup = BeautifulSoup(resp.text, "html.parser")
-
-    review_divs = soup.find_all("div", {"class": "t-ZTKy"})
-    return [clean(div.text.replace("READ MORE", "")) for div in review_divs]
-
+async def extract_flipkart_reviews(url: str, max_pages: int = 1):
+    return await cached_reviews(
+        url, f"scraperapi:flipkart:{max_pages}",
+        lambda: _scrape_pages_via_api(url, max_pages, PROFILES["flipkart"], country="IN"),
+    )
 
 
 # ---------------------------------------------------------
 # CSV GENERATION
 # ---------------------------------------------------------
 def generate_csv(reviews):
+    import pandas as pd
+
     df = pd.DataFrame({"text": reviews})
 
     stream = io.StringIO()
@@ -110,14 +109,17 @@ def generate_csv(reviews):
 # 4️⃣ Extract GENERIC Reviews → POST /reviews/extract
 # ---------------------------------------------------------
 @router.post("/reviews/extract", tags=["Review Extraction"])
-def extract_to_csv(url: str, username: str = Depends(verify_token)):
+async def extract_to_csv(url: str, username: str = Depends(verify_token)):
 
-    reviews = extract_generic_reviews(url)
+    try:
+        reviews = await extract_generic_reviews(url)
+    except FetchError as e:
+        raise HTTPException(502, f"Could not fetch the review pages ({e})")
 
     if not reviews:
         raise HTTPException(400, "No reviews were found on this page")
 
-    csv_stream = generate_csv(reviews)
+    csv_stream = await run_in_threadpool(generate_csv, reviews)
 
     return StreamingResponse(
         csv_stream,
@@ -130,14 +132,21 @@ def extract_to_csv(url: str, username: str = Depends(verify_token)):
 # 5️⃣ Extract Amazon Reviews → POST /reviews/amazon
 # ---------------------------------------------------------
 @router.post("/reviews/amazon", tags=["Review Extraction"])
-def extract_amazon_to_csv(url: str, username: str = Depends(verify_token)):
+async def extract_amazon_to_csv(
+    url: str,
+    max_pages: int = Query(1, ge=1, le=SCRAPER_MAX_PAGES),
+    username: str = Depends(verify_token)
+):
 
-    reviews = extract_amazon_reviews(url)
+    try:
+        reviews = await extract_amazon_reviews(url, max_pages)
+    except FetchError as e:
+        raise HTTPException(502, f"Could not fetch the review pages ({e})")
 
     if not reviews:
         raise HTTPException(400, "Could not scrape any Amazon reviews.")
 
-    csv_stream = generate_csv(reviews)
+    csv_stream = await run_in_threadpool(generate_csv, reviews)
 
     return StreamingResponse(
         csv_stream,
@@ -150,14 +159,21 @@ def extract_amazon_to_csv(url: str, username: str = Depends(verify_token)):
 # 6️⃣ Extract Flipkart Reviews → POST /reviews/flipkart
 # ---------------------------------------------------------
 @router.post("/reviews/flipkart", tags=["Review Extraction"])
-def extract_flipkart_to_csv(url: str, username: str = Depends(verify_token)):
+async def extract_flipkart_to_csv(
+    url: str,
+    max_pages: int = Query(1, ge=1, le=SCRAPER_MAX_PAGES),
+    username: str = Depends(verify_token)
+):
 
-    reviews = extract_flipkart_reviews(url)
+    try:
+        reviews = await extract_flipkart_reviews(url, max_pages)
+    except FetchError as e:
+        raise HTTPException(502, f"Could not fetch the review pages ({e})")
 
     if not reviews:
         raise HTTPException(400, "Could not scrape any Flipkart reviews.")
 
-    csv_stream = generate_csv(reviews)
+    csv_stream = await run_in_threadpool(generate_csv, reviews)
 
     return StreamingResponse(
         csv_stream,
@@ -0,0 +1,352 @@
+"""
+Catalog of each user's uploads and reports: the `uploaded_files` collection.
+
+One record per file_id, kept in step with blob storage by the routes:
+
+    has_upload    {username}/uploads/{file_id}.csv exists
+    has_summary   {username}/results/{file_id}_summary.xlsx exists
+    analysis      latest analysis state (status, job_id, summary, ...)
+    content_sha   set when the upload lives in a shared content blob
+
+Uploads are stored once per account and content: a {"kind": "content"}
+record per sha256 holds the blob path, a refcount of file records using it,
+and cached inference results per model. Records carry the account id (the
+user document's _id), so an account re-registered under a deleted one's
+username never picks up content its purge is removing; file records keep
+the account their content belongs to. Content blobs live under
+{username}/content/ with a unique suffix, and are only deleted after their
+record has been removed at refcount 0, so an upload racing a deletion never
+ends up pointing at a deleted blob.
+
+Listing reads this collection only (index on username, uploaded_at), so it
+costs the same however many blobs a user has. reconcile() repairs drift
+against blob storage (a crash between a blob write and its record update,
+files touched outside the API):
+
+    python -m app.file_catalog [username]
+"""
+import asyncio
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.database import async_files_collection
+from app.blob_service import (
+    BlobNotFound,
+    delete_blob,
+    delete_blobs,
+    get_blob_properties,
+    list_user_blobs,
+    upload_bytes,
+)
+
+# Periodic reconciliation from the app lifespan; 0 = only when run by hand.
+# Every worker runs its own loop, so keep this long (or enable it on one instance).
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("FILE_CATALOG_RECONCILE_SECONDS", "0"))
+
+UPLOAD_BLOB = re.compile(r"^(?P<username>[^/]+)/uploads/(?P<file_id>[^/]+)\.csv$")
+SUMMARY_BLOB = re.compile(r"^(?P<username>[^/]+)/results/(?P<file_id>[^/]+)_summary\.xlsx$")
+
+# Records written this recently are left alone by reconcile(): their blob
+# write may have landed after the listing was taken
+RECONCILE_GRACE = timedelta(minutes=5)
+
+CONTENT = "content"
+FILES_ONLY = {"kind": {"$ne": CONTENT}}
+
+# Records that still point at something in storage
+LISTED = {**FILES_ONLY, "$or": [{"has_upload": {"$ne": False}}, {"has_summary": True}]}
+
+
+def upload_path(username: str, file_id: str) -> str:
+    return f"{username}/uploads/{file_id}.csv"
+
+
+def summary_path(username: str, file_id: str) -> str:
+    return f"{username}/results/{file_id}_summary.xlsx"
+
+
+def results_key(model_name: str) -> str:
+    """Field-name-safe key for a model's cached results."""
+    return hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:16]
+
+
+async def record_upload(file_id: str, username: str, **fields):
+    # upsert: reconcile() may have seen the blob before this record landed
+    await async_files_collection.update_one(
+        {"file_id": file_id},
+        {"$set": {
+            "username": username,
+            "blob_path": upload_path(username, file_id),
+            "has_upload": True,
+            "uploaded_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "analysis": {"status": "not_started"},
+            **fields,
+        }},
+        upsert=True,
+    )
+
+
+async def record_analysis(file_id: str, username: str, **analysis):
+    """Replace the record's analysis state (status, job_id, summary, ...)."""
+    await async_files_collection.update_one(
+        {"file_id": file_id, "username": username},
+        {"$set": {"analysis": analysis, "updated_at": datetime.utcnow()}},
+    )
+
+
+async def record_summary(file_id: str, username: str, exists: bool = True):
+    now = datetime.utcnow()
+    if exists:
+        update = {"$set": {"has_summary": True, "summary_blob": summary_path(username, file_id), "updated_at": now}}
+    else:
+        update = {"$set": {"has_summary": False, "updated_at": now}, "$unset": {"summary_blob": ""}}
+    await async_files_collection.update_one({"file_id": file_id, "username": username}, update)
+
+
+async def mark_deleted(file_id: str, username: str) -> bool:
+    """
+    The upload is gone; the record stays while a summary still exists.
+    False if it was already marked (so callers release content only once).
+    """
+    result = await async_files_collection.update_one(
+        {"file_id": file_id, "username": username, "has_upload": {"$ne": False}},
+        {"$set": {"has_upload": False, "deleted_at": datetime.utcnow(), "updated_at": datetime.utcnow()}},
+    )
+    return result.modified_count > 0
+
+
+async def get_file(file_id: str, username: str, projection: Optional[dict] = None):
+    return await async_files_collection.find_one(
+        {"file_id": file_id, "username": username, "has_upload": {"$ne": False}, **FILES_ONLY},
+        projection,
+    )
+
+
+async def has_summary(file_id: str, username: str) -> bool:
+    doc = await async_files_collection.find_one(
+        {"file_id": file_id, "username": username, "has_summary": True, **FILES_ONLY}, {"_id": 1}
+    )
+    return doc is not None
+
+
+async def list_files(username: str, limit: int, after: Optional[tuple] = None):
+    """
+    Newest first. `after` is the (uploaded_at, _id) of the last record of
+    the previous page. Returns up to limit + 1 records so the caller can tell
+    whether another page follows.
+    """
+    query = {"username": username, **LISTED}
+    if after:
+        uploaded_at, last_id = after
+        query = {"$and": [query, {"$or": [
+            {"uploaded_at": {"$lt": uploaded_at}},
+            {"uploaded_at": uploaded_at, "_id": {"$lt": last_id}},
+        ]}]}
+
+    cursor = (
+        async_files_collection.find(query)
+        .sort([("uploaded_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+    return await cursor.to_list(length=limit + 1)
+
+
+# -------------------------------------------------
+# CONTENT (deduplicated upload blobs)
+# -------------------------------------------------
+def _content_filter(username: str, account: Optional[str], sha256: str) -> dict:
+    # account None: content stored before records carried one
+    return {"kind": CONTENT, "username": username, "account": account, "sha256": sha256}
+
+
+async def acquire_content(username: str, account: str, sha256: str):
+    """Take a reference on already-stored content; None if there is none."""
+    return await async_files_collection.find_one_and_update(
+        _content_filter(username, account, sha256),
+        {"$inc": {"refcount": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def store_content(username: str, account: str, sha256: str, data: bytes, **fields) -> dict:
+    """
+    Upload `data` as new content and take a reference on it. If someone
+    stored the same content meanwhile, theirs wins and ours is removed.
+    """
+    blob_path = f"{username}/content/{sha256}.{uuid4().hex[:12]}.csv"
+    await upload_bytes(data, blob_path, compress=True)
+
+    try:
+        doc = await async_files_collection.find_one_and_update(
+            _content_filter(username, account, sha256),
+            {
+                "$inc": {"refcount": 1},
+                "$setOnInsert": {
+                    "blob_path": blob_path,
+                    "size_bytes": len(data),
+                    "created_at": datetime.utcnow(),
+                    "results": {},
+                    **fields,
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # concurrent upsert of the same content won the insert
+        doc = await acquire_content(username, account, sha256)
+        if doc is None:
+            raise
+
+    if doc["blob_path"] != blob_path:
+        await delete_blob(blob_path)
+    return doc
+
+
+async def release_content(username: str, account: Optional[str], sha256: str):
+    """Drop a reference; the last one removes the record, then its blobs."""
+    doc = await async_files_collection.find_one_and_update(
+        _content_filter(username, account, sha256),
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None or doc["refcount"] > 0:
+        return
+
+    # an upload may have re-acquired it since: only delete at refcount 0
+    gone = await async_files_collection.find_one_and_delete({"_id": doc["_id"], "refcount": {"$lte": 0}})
+    if gone:
+        await delete_blobs([gone["blob_path"], *gone.get("results", {}).values()])
+
+
+async def cached_results_path(username: str, account: Optional[str], sha256: str, model_name: str) -> Optional[str]:
+    doc = await async_files_collection.find_one(_content_filter(username, account, sha256), {"results": 1})
+    return (doc or {}).get("results", {}).get(results_key(model_name))
+
+
+async def store_results(username: str, account: Optional[str], sha256: str, model_name: str, data: bytes):
+    """Cache scored rows for this content and model, if the content still exists."""
+    key = results_key(model_name)
+    blob_path = f"{username}/content/{sha256}.{key}.{uuid4().hex[:12]}.results.json"
+    await upload_bytes(data, blob_path, compress=True)
+
+    previous = await async_files_collection.find_one_and_update(
+        _content_filter(username, account, sha256),
+        {"$set": {f"results.{key}": blob_path}},
+        projection={"results": 1},
+    )
+    if previous is None:
+        # content was deleted while we were scoring
+        await delete_blob(blob_path)
+    elif previous.get("results", {}).get(key):
+        await delete_blobs([previous["results"][key]])
+
+
+# -------------------------------------------------
+# RECONCILIATION
+# -------------------------------------------------
+async def _blob_state(prefix: str):
+    """
+    ((username, file_id) -> {"has_upload": bool, "has_summary": bool},
+     set of every blob name)
+    """
+    state = {}
+    names = set(await list_user_blobs(prefix))
+    for name in names:
+        for kind, pattern in (("has_upload", UPLOAD_BLOB), ("has_summary", SUMMARY_BLOB)):
+            match = pattern.match(name)
+            if match:
+                key = (match["username"], match["file_id"])
+                state.setdefault(key, {"has_upload": False, "has_summary": False})[kind] = True
+    return state, names
+
+
+async def reconcile(username: Optional[str] = None) -> dict:
+    """Make has_upload / has_summary match blob storage; add missing records."""
+    settled_before = datetime.utcnow() - RECONCILE_GRACE
+    blobs, names = await _blob_state(f"{username}/" if username else "")
+    stats = {"checked": 0, "updated": 0, "created": 0}
+
+    query = {
+        **FILES_ONLY,
+        "$or": [{"updated_at": {"$lt": settled_before}}, {"updated_at": {"$exists": False}}],
+    }
+    if username:
+        query["username"] = username
+    projection = {
+        "file_id": 1, "username": 1, "has_upload": 1, "has_summary": 1,
+        "updated_at": 1, "content_sha": 1, "blob_path": 1,
+    }
+
+    async for doc in async_files_collection.find(query, projection):
+        stats["checked"] += 1
+        actual = blobs.pop((doc["username"], doc["file_id"]), {"has_upload": False, "has_summary": False})
+        if doc.get("content_sha"):
+            # a deleted upload keeps pointing at content other files may still use
+            actual["has_upload"] = doc.get("has_upload", True) and doc.get("blob_path") in names
+        recorded = {
+            "has_upload": doc.get("has_upload", True),
+            "has_summary": doc.get("has_summary", False),
+        }
+        if actual != recorded or "has_upload" not in doc:
+            update = {"$set": {**actual, "updated_at": datetime.utcnow()}}
+            if actual["has_summary"]:
+                update["$set"]["summary_blob"] = summary_path(doc["username"], doc["file_id"])
+            if not actual["has_upload"] and recorded["has_upload"]:
+                update["$set"]["deleted_at"] = datetime.utcnow()
+            # skip it if a route touched the record meanwhile
+            result = await async_files_collection.update_one(
+                {"_id": doc["_id"], "updated_at": doc.get("updated_at")}, update
+            )
+            stats["updated"] += result.modified_count
+
+    # blobs nobody recorded (uploads that predate the catalog, lost writes)
+    for (owner, file_id), actual in blobs.items():
+        path = upload_path(owner, file_id) if actual["has_upload"] else summary_path(owner, file_id)
+        try:
+            props = await get_blob_properties(path)
+        except BlobNotFound:
+            continue
+
+        fields = {
+            "username": owner,
+            **actual,
+            "uploaded_at": props["last_modified"],
+            "updated_at": datetime.utcnow(),
+        }
+        if actual["has_upload"]:
+            fields.update(blob_path=path, size_bytes=props["size"])
+        if actual["has_summary"]:
+            fields["summary_blob"] = summary_path(owner, file_id)
+
+        result = await async_files_collection.update_one(
+            {"file_id": file_id}, {"$setOnInsert": fields}, upsert=True
+        )
+        if result.upserted_id is not None:
+            stats["created"] += 1
+
+    return stats
+
+
+async def run_reconciler():
+    """Background task started from the app lifespan when enabled."""
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+        try:
+            print("File catalog reconciled:", await reconcile())
+        except Exception as e:
+            print("File catalog reconcile failed:", e)
+
+
+if __name__ == "__main__":
+    import sys
+
+    print("File catalog reconciled:", asyncio.run(reconcile(sys.argv[1] if len(sys.argv) > 1 else None)))
@@ -0,0 +1,153 @@
+"""
+Review extraction from HTML with lxml and precompiled XPath.
+
+The site profile is picked from the URL host, so a page is only searched
+for the selectors of its own site, in a single XPath evaluation:
+
+    reviews, next_url = extract_page(html, url)
+    reviews = extract_reviews(html, profile=PROFILES["flipkart"])
+    snippets = extract_generic(html)        # unknown sites, keyword search
+
+Unknown hosts fall back to the union of every profile's selectors.
+
+    python -m benchmarks.extract_bench      # compares against BeautifulSoup
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from lxml import etree, html as lxml_html
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+@dataclass(frozen=True)
+class SiteProfile:
+    name: str
+    hosts: Tuple[str, ...]        # host fragments, e.g. "amazon." matches amazon.in / amazon.com
+    reviews: str                  # XPath selecting review elements
+    next_page: Optional[str] = None   # XPath selecting the next page href
+    strip: Tuple[str, ...] = ()   # boilerplate removed from review text
+
+    def matches(self, host: str) -> bool:
+        return any(h in host for h in self.hosts)
+
+
+PROFILES = {
+    p.name: p for p in [
+        SiteProfile(
+            "amazon",
+            hosts=("amazon.",),
+            reviews=f"//span[@data-hook='review-body' or {_has_class('review-text-content')}]",
+            next_page=f"//li[{_has_class('a-last')}]/a/@href",
+        ),
+        SiteProfile(
+            "flipkart",
+            hosts=("flipkart.",),
+            reviews=f"//div[{_has_class('_6K-7Co')} or {_has_class('t-ZTKy')}]",
+            strip=("READ MORE",),
+        ),
+        SiteProfile(
+            "bestbuy",
+            hosts=("bestbuy.",),
+            reviews=f"//p[{_has_class('pre-white-space')}]",
+        ),
+        SiteProfile(
+            "walmart",
+            hosts=("walmart.",),
+            reviews=f"//span[{_has_class('review-text')}]",
+        ),
+    ]
+}
+
+ANY_SITE = SiteProfile(
+    "any",
+    hosts=(),
+    reviews=" | ".join(p.reviews for p in PROFILES.values()),
+    next_page=PROFILES["amazon"].next_page,
+    strip=("READ MORE",),
+)
+
+# Compiled once: evaluating a compiled XPath skips parsing the expression
+_REVIEWS = {p.name: etree.XPath(p.reviews) for p in [*PROFILES.values(), ANY_SITE]}
+_NEXT_PAGE = {p.name: etree.XPath(p.next_page) for p in [*PROFILES.values(), ANY_SITE] if p.next_page}
+
+GENERIC_KEYWORDS = ("review", "comment", "feedback", "testimonial")
+
+_UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_GENERIC_TEXT = etree.XPath(
+    "//text()[not(ancestor::script or ancestor::style)]"
+    f"[{' or '.join(f'contains(translate(., $upper, $lower), {k!r})' for k in GENERIC_KEYWORDS)}]"
+)
+
+
+def profile_for(url: Optional[str]) -> SiteProfile:
+    host = (urlsplit(url).hostname or "") if url else ""
+    for profile in PROFILES.values():
+        if profile.matches(host):
+            return profile
+    return ANY_SITE
+
+
+def _parse(html):
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        # str with an XML encoding declaration: let lxml decode the bytes
+        if isinstance(html, str):
+            return lxml_html.document_fromstring(html.encode("utf-8"))
+        raise
+
+
+def clean_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _review_texts(tree, profile: SiteProfile) -> List[str]:
+    reviews = []
+    for element in _REVIEWS[profile.name](tree):
+        text = element.text_content()
+        for boilerplate in profile.strip:
+            text = text.replace(boilerplate, "")
+        text = clean_text(text)
+        if text:
+            reviews.append(text)
+    # nested matches (amazon's review-body wraps review-text-content) repeat
+    return list(dict.fromkeys(reviews))
+
+
+def extract_page(html, url: Optional[str] = None, profile: Optional[SiteProfile] = None):
+    """(reviews in page order, absolute next page URL or None)."""
+    profile = profile or profile_for(url)
+    tree = _parse(html)
+    if tree is None:
+        return [], None
+
+    reviews = _review_texts(tree, profile)
+
+    next_url = None
+    if profile.name in _NEXT_PAGE:
+        hrefs = _NEXT_PAGE[profile.name](tree)
+        if hrefs:
+            next_url = urljoin(url or "", str(hrefs[0]))
+    return reviews, next_url
+
+
+def extract_reviews(html, url: Optional[str] = None, profile: Optional[SiteProfile] = None) -> List[str]:
+    return extract_page(html, url, profile)[0]
+
+
+def extract_generic(html, min_words: int = 4) -> List[str]:
+    """Text nodes mentioning a review keyword, outside scripts and styles."""
+    tree = _parse(html)
+    if tree is None:
+        return []
+    snippets = (clean_text(t) for t in _GENERIC_TEXT(tree, upper=_UPPER, lower=_UPPER.lower()))
+    return list(dict.fromkeys(s for s in snippets if len(s.split()) >= min_words))
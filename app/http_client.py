@@ -0,0 +1,145 @@
+"""
+Shared async HTTP client for the review scrapers.
+
+One aiohttp session per worker, created on first use and closed from the app
+lifespan, so every scrape reuses keep-alive connections:
+
+    html = await get_text(url)
+    pages = await get_many([url_1, url_2, url_3])     # fetched concurrently
+
+    - HTTP_MAX_CONNECTIONS sockets in total, HTTP_PER_HOST_CONNECTIONS per
+      host (the connector queues the rest), so concurrent pagination cannot
+      hammer one site
+    - HTTP_CONNECT_TIMEOUT_SECONDS / HTTP_TIMEOUT_SECONDS per attempt
+    - connection errors, timeouts, 429 and 5xx are retried HTTP_RETRIES
+      times with exponential backoff (Retry-After is honoured, capped)
+
+aiohttp is imported on first use, like the other service clients.
+"""
+import asyncio
+import os
+import random
+import re
+from typing import Dict, List, Mapping, NamedTuple, Optional, Union
+from urllib.parse import urlsplit, urlunsplit
+
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+PER_HOST_CONNECTIONS = int(os.getenv("HTTP_PER_HOST_CONNECTIONS", "4"))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "20"))
+RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+BACKOFF_BASE_SECONDS = float(os.getenv("HTTP_BACKOFF_BASE_SECONDS", "0.5"))
+MAX_RETRY_AFTER_SECONDS = 10.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+class Response(NamedTuple):
+    status: int
+    text: Optional[str]     # None for 304 Not Modified
+    headers: Mapping[str, str]  # case-insensitive
+
+
+_QUERY_IN_TEXT = re.compile(r"(\w+://[^\s?'\"]*)\?[^\s'\")]*")
+
+
+def redact(url: str) -> str:
+    """`url` without query string or userinfo, safe to log (proxy API URLs carry api_key)."""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc.rpartition("@")[2], parts.path, "", "")) + ("?..." if parts.query else "")
+
+
+class FetchError(Exception):
+    """The page could not be fetched (after retries) or answered non-2xx."""
+
+    def __init__(self, url: str, message: str, status: Optional[int] = None):
+        # aiohttp errors can quote the full (re-encoded) URL too
+        message = _QUERY_IN_TEXT.sub(r"\1?...", message)
+        super().__init__(f"{redact(url)}: {message}")
+        self.url = redact(url)
+        self.status = status
+
+
+_session = None
+
+
+def get_session():
+    """aiohttp.ClientSession bound to the running event loop."""
+    global _session
+    if _session is None or _session.closed:
+        import aiohttp
+
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS,
+                limit_per_host=PER_HOST_CONNECTIONS,
+                ttl_dns_cache=300,
+            ),
+            timeout=aiohttp.ClientTimeout(total=TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+            headers=DEFAULT_HEADERS,
+        )
+    return _session
+
+
+async def close():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+def _delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_RETRY_AFTER_SECONDS)
+    return BACKOFF_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.0)
+
+
+async def fetch(
+    url: str,
+    params: Optional[Dict[str, str]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> Response:
+    """
+    2xx or 304 response (send If-None-Match / If-Modified-Since to get a
+    304); FetchError otherwise. `timeout` overrides HTTP_TIMEOUT_SECONDS.
+    """
+    import aiohttp
+
+    request_timeout = aiohttp.ClientTimeout(total=timeout, connect=CONNECT_TIMEOUT_SECONDS) if timeout else None
+    for attempt in range(RETRIES + 1):
+        last = attempt == RETRIES
+        try:
+            async with get_session().get(url, params=params, headers=headers, timeout=request_timeout) as resp:
+                if resp.status in RETRY_STATUSES and not last:
+                    await asyncio.sleep(_delay(attempt, resp.headers.get("Retry-After")))
+                    continue
+                if resp.status >= 400:
+                    raise FetchError(url, f"HTTP {resp.status}", resp.status)
+                text = None if resp.status == 304 else await resp.text(errors="replace")
+                return Response(resp.status, text, resp.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if last:
+                raise FetchError(url, f"{type(e).__name__}: {e}") from e
+            await asyncio.sleep(_delay(attempt))
+
+
+async def get_text(url: str, **kwargs) -> str:
+    """Body of a 2xx response; FetchError otherwise."""
+    return (await fetch(url, **kwargs)).text
+
+
+async def get_many(urls: List[str], **kwargs) -> List[Union[str, FetchError]]:
+    """Fetch concurrently; results in `urls` order, failures as FetchError."""
+    async def one(url):
+        try:
+            return await get_text(url, **kwargs)
+        except FetchError as e:
+            return e
+
+    return await asyncio.gather(*(one(url) for url in urls))
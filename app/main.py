@@ -1,15 +1,48 @@
 from fastapi import FastAPI
+import asyncio
 import time
+from contextlib import asynccontextmanager
 from fastapi import Request
-from app.database import performance_collection
+from app.database import async_performance_collection, ensure_indexes
 from datetime import datetime
 from app.routes import router as sentiment_router
 from app.extraction import router as extraction_router
 from app.auth import router as auth_router 
+from app import revocation
+from app import blob_service
+from app import file_catalog
+from app import email_outbox
+from app import browser_pool
+from app import http_client
+from starlette.concurrency import run_in_threadpool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    await revocation.refresh()
+    background = [
+        asyncio.create_task(revocation.run_refresher()),
+        asyncio.create_task(email_outbox.run_sender()),
+    ]
+    if file_catalog.RECONCILE_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(file_catalog.run_reconciler()))
+
+    yield
+
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await blob_service.close()
+    await http_client.close()
+    await run_in_threadpool(browser_pool.pool.close)
+
+
 app = FastAPI(
     title="Cloud Sentiment API",    
     description="A RESTful API for sentiment analysis using Hugging Face + Azure Blob + JWT authentication.",
-    version="2.0"
+    version="2.0",
+    lifespan=lifespan
 )
 
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
@@ -26,7 +59,7 @@ async def measure_request_time(request: Request, call_next):
     response = await call_next(request)
     end = time.time()
 
-    performance_collection.insert_one({
+    await async_performance_collection.insert_one({
         "type": "backend_response",
         "path": request.url.path,
         "duration_ms": round((end - start) * 1000, 3),
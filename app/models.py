@@ -35,3 +35,5 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
     email: Optional[str] = None
+    is_verified: Optional[bool] = None
+    account_id: Optional[str] = None
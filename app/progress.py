@@ -0,0 +1,209 @@
+"""
+Live progress for long-running analyses (file and URL jobs).
+
+The inference loop (running in a worker thread) publishes events through a
+JobReporter; Server-Sent Events subscribers on the event loop receive them
+through bounded per-subscriber queues. Publishing never blocks or awaits:
+if a subscriber falls behind, its oldest queued progress event is dropped
+(the next one carries the running totals anyway).
+
+Jobs live in this worker's memory. With several gunicorn workers, clients
+must reach the same worker for the job and its event stream (sticky
+sessions), or they only see the final result.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Finished jobs stay visible this long for late subscribers
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "600"))
+
+# Events buffered per subscriber before old progress events get dropped
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("PROGRESS_QUEUE_SIZE", "100"))
+
+TERMINAL = ("complete", "failed")
+
+
+class JobNotFound(Exception):
+    pass
+
+
+class _Job:
+    def __init__(self, username: str):
+        self.username = username
+        self.state: Dict[str, Any] = {"type": "pending"}
+        self.subscribers: List[tuple] = []
+        self.finished_at: Optional[float] = None
+        self.claimed = False
+
+
+_jobs: Dict[str, _Job] = {}
+_lock = threading.Lock()
+
+
+def _prune():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for job_id in [j for j, job in _jobs.items() if job.finished_at and job.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def _offer(queue: asyncio.Queue, event: dict):
+    """Runs on the subscriber's loop. Never blocks the publisher."""
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(event)
+
+
+def _get_or_create(job_id: str, username: str) -> _Job:
+    job = _jobs.get(job_id)
+    if job is None:
+        job = _jobs[job_id] = _Job(username)
+    elif job.username != username:
+        raise JobNotFound(job_id)
+    return job
+
+
+def claim(job_id: str, username: str):
+    """
+    Reserve `job_id` for `username` before the job starts, so no other user
+    can take it in between. Raises JobNotFound if it belongs to someone
+    else. A claimed job that never starts is dropped after
+    JOB_RETENTION_SECONDS.
+    """
+    with _lock:
+        _prune()
+        job = _get_or_create(job_id, username)
+        job.claimed = True
+        if job.state.get("type") == "pending":
+            job.finished_at = time.time()
+
+
+def publish(job_id: str, event: dict):
+    """
+    Record `event` as the job's latest state and fan it out. Thread-safe.
+    Per-chunk "results" are delivered to live subscribers but not kept in
+    the snapshot that late subscribers receive.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job.state = {k: v for k, v in event.items() if k != "results"}
+        if event.get("type") in TERMINAL:
+            job.finished_at = time.time()
+        subscribers = list(job.subscribers)
+
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(_offer, queue, event)
+        except RuntimeError:
+            # subscriber's loop is closed
+            pass
+
+
+class JobReporter:
+    """
+    Used by the inference loop:
+
+        with JobReporter(job_id, username, total=len(texts)) as job:
+            for chunk in ...:
+                job.progress(chunk_results)
+            job.complete(summary)
+
+    Leaving the block with an exception publishes a "failed" event.
+    """
+
+    def __init__(self, job_id: str, username: str, total: Optional[int] = None):
+        self.job_id = job_id
+        self.username = username
+        self.total = total
+        self.processed = 0
+        self.counts = {"POSITIVE": 0, "NEGATIVE": 0, "NEUTRAL": 0}
+        self.done = False
+
+    def __enter__(self):
+        with _lock:
+            _prune()
+            job = _get_or_create(self.job_id, self.username)
+            job.finished_at = None
+        publish(self.job_id, self._event("running"))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and not self.done:
+            self.fail(getattr(exc, "detail", None) or str(exc))
+        return False
+
+    def _event(self, type_: str, **extra) -> dict:
+        return {
+            "type": type_,
+            "job_id": self.job_id,
+            "processed": self.processed,
+            "total": self.total,
+            "counts": dict(self.counts),
+            **extra,
+        }
+
+    def set_total(self, total: int):
+        self.total = total
+
+    def progress(self, results: List[Dict[str, Any]]):
+        self.processed += len(results)
+        for r in results:
+            label = r["label"]
+            self.counts[label] = self.counts.get(label, 0) + 1
+        publish(self.job_id, self._event("progress", results=results))
+
+    def complete(self, summary: Dict[str, Any]):
+        self.done = True
+        publish(self.job_id, self._event("complete", summary=summary))
+
+    def fail(self, error: str):
+        self.done = True
+        publish(self.job_id, self._event("failed", error=error))
+
+
+async def subscribe(job_id: str, username: str, heartbeat: float = 15.0):
+    """
+    Async generator of events for `job_id`, starting with the current
+    snapshot. Subscribing before the job starts is allowed. Yields None as a
+    heartbeat when nothing happened for `heartbeat` seconds. Raises
+    JobNotFound if the job belongs to another user.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    with _lock:
+        _prune()
+        job = _get_or_create(job_id, username)
+        entry = (loop, queue)
+        job.subscribers.append(entry)
+        snapshot = dict(job.state, job_id=job_id)
+
+    try:
+        yield snapshot
+        if snapshot.get("type") in TERMINAL:
+            return
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield event
+            if event.get("type") in TERMINAL:
+                return
+    finally:
+        with _lock:
+            if entry in job.subscribers:
+                job.subscribers.remove(entry)
+            # a job nobody started, claimed or watches
+            if (job.state.get("type") == "pending" and not job.claimed and not job.subscribers
+                    and _jobs.get(job_id) is job):
+                del _jobs[job_id]
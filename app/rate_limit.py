@@ -0,0 +1,98 @@
+"""
+Token-bucket rate limiting.
+
+    limiter = get_limiter(capacity=5, per_seconds=60)   # 5 hits, refilled over a minute
+    retry_after = await limiter.hit("login:id:alice")
+    if retry_after is not None: -> 429
+
+RATE_LIMIT_BACKEND selects where bucket state lives:
+    memory  per worker (default) — cheapest; limits are per worker
+    mongo   shared `rate_limits` collection — one atomic update per hit,
+            limits hold across workers and instances
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+
+
+def parse_rate(value: str):
+    """'5/60' -> (capacity=5, per_seconds=60.0)"""
+    hits, _, seconds = value.partition("/")
+    return int(hits), float(seconds or 60)
+
+
+class MemoryTokenBucket:
+    def __init__(self, capacity: int, per_seconds: float, max_keys: int = 100000):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str) -> Optional[float]:
+        """Take one token. Returns None if allowed, else seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return None if allowed else (1 - tokens) / self.rate
+
+
+class MongoTokenBucket:
+    def __init__(self, capacity: int, per_seconds: float, collection):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.collection = collection
+
+    async def hit(self, key: str) -> Optional[float]:
+        now = datetime.utcnow()
+        elapsed_s = {"$max": [0, {"$divide": [
+            {"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000
+        ]}]}
+
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [self.capacity, {"$add": [
+                        {"$ifNull": ["$tokens", self.capacity]},
+                        {"$multiply": [elapsed_s, self.rate]},
+                    ]}]},
+                    "updated_at": now,
+                }},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [
+                        {"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"
+                    ]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        return None if doc["allowed"] else (1 - doc["tokens"]) / self.rate
+
+
+def get_limiter(capacity: int, per_seconds: float):
+    if RATE_LIMIT_BACKEND == "mongo":
+        from app.database import async_rate_limits_collection
+
+        return MongoTokenBucket(capacity, per_seconds, async_rate_limits_collection)
+    return MemoryTokenBucket(capacity, per_seconds)
@@ -143,142 +143,242 @@
 #     reviews = extract_reviews_requests(url)
 #     return reviews
 
-import time
-import re
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import os
+import threading
+from typing import AsyncIterator, Callable, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-# Selenium
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
+from starlette.concurrency import run_in_threadpool
 
-# User agent for requests fallback
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
-    "Accept-Language": "en-US,en;q=0.9"
-}
+from app.browser_pool import browser
+from app.html_extract import extract_page, extract_reviews
+from app.http_client import FetchError
+from app.scrape_cache import cached_reviews, get_many, get_text, stream_cached_reviews
+
+# Review bodies on the sites the Selenium scraper handles
+# (Amazon, Flipkart, BestBuy, Walmart)
+REVIEW_SELECTOR = "span[data-hook='review-body'], div._6K-7Co, p.pre-white-space, span.review-text"
+
+# Longest wait for a page's reviews to render before giving up on it
+PAGE_WAIT_SECONDS = float(os.getenv("SCRAPER_PAGE_WAIT_SECONDS", "10"))
+
+# Query parameters that carry the page number of a review listing
+PAGE_PARAMS = ("pageNumber", "page")
+
+# Most pages one request may scrape (every known page is fetched at once)
+SCRAPER_MAX_PAGES = int(os.getenv("SCRAPER_MAX_PAGES", "20"))
 
 
 # --------------------------------------------------------------------
 # HELPERS
 # --------------------------------------------------------------------
-def clean_text(text: str) -> str:
-    """Remove HTML spaces, emojis, weird characters."""
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+def page_urls(url: str, max_pages: int) -> list:
+    """
+    The next `max_pages` pages, starting at `url`, when the page number is
+    in the query string (e.g. Amazon's ?pageNumber=2); otherwise just `url`.
+    Never more than SCRAPER_MAX_PAGES.
+    """
+    max_pages = min(max_pages, SCRAPER_MAX_PAGES)
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    current = dict(query)
+    param = next((p for p in PAGE_PARAMS if p in current), None)
+    if param is None or max_pages <= 1:
+        return [url]
+
+    first = int(current[param]) if current[param].isdigit() else 1
+    return [
+        urlunsplit(parts._replace(query=urlencode([(k, str(n) if k == param else v) for k, v in query])))
+        for n in range(first, first + max_pages)
+    ]
+
+
+def past_last_page(error: FetchError, pages_done: int) -> bool:
+    """
+    A page that does not exist after the first one ends the listing (some
+    sites answer 404 past the last page); any other failed fetch is an error.
+    """
+    return pages_done > 0 and error.status in (404, 410)
 
 
 # --------------------------------------------------------------------
-# SELENIUM SCRAPER (FIXED VERSION)
+# SELENIUM SCRAPER (browsers come from app/browser_pool.py)
 # --------------------------------------------------------------------
 def extract_reviews_selenium(url: str, max_pages: int = 5):
     """Extract reviews using Selenium — supports dynamic pages."""
+    with browser() as driver:
+        return _scrape_pages(driver, url, max_pages)
 
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
 
-    # ❗❗ FIX: correct Selenium initialization
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+def _wait_for_reviews(driver) -> bool:
+    """Return as soon as a review is on the page; False after PAGE_WAIT_SECONDS."""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
 
-    reviews = []
+    try:
+        WebDriverWait(driver, PAGE_WAIT_SECONDS, poll_frequency=0.2).until(
+            lambda d: d.find_elements(By.CSS_SELECTOR, REVIEW_SELECTOR)
+        )
+        return True
+    except TimeoutException:
+        return False
+
+
+def _scrape_pages(driver, url: str, max_pages: int, on_page: Optional[Callable[[list], bool]] = None):
+    """
+    Reviews of up to `max_pages` pages. `on_page` receives each page's
+    reviews not seen on an earlier page; returning False stops the scrape.
+    """
+    reviews = {}
     current_url = url
 
     for _ in range(max_pages):
         driver.get(current_url)
-        time.sleep(2)
-
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-
-        # Amazon
-        amazon_reviews = soup.select("span[data-hook='review-body']")
-        for r in amazon_reviews:
-            text = clean_text(r.get_text())
-            if text:
-                reviews.append(text)
-
-        # Flipkart
-        flip_reviews = soup.select("div._6K-7Co")
-        for r in flip_reviews:
-            text = clean_text(r.get_text())
-            if text:
-                reviews.append(text)
-
-        # BestBuy
-        bb_reviews = soup.select("p.pre-white-space")
-        for r in bb_reviews:
-            text = clean_text(r.get_text())
-            if text:
-                reviews.append(text)
-
-        # Walmart
-        wm_reviews = soup.select("span.review-text")
-        for r in wm_reviews:
-            text = clean_text(r.get_text())
-            if text:
-                reviews.append(text)
-
-        # Amazon next page
-        next_btn = soup.select_one("li.a-last a")
-        if next_btn:
-            current_url = "https://www.amazon.in" + next_btn["href"]
-        else:
+        if not _wait_for_reviews(driver):
+            # nothing rendered: an empty page, or one past the last review
+            break
+
+        found, next_url = extract_page(driver.page_source, current_url)
+        new = [r for r in dict.fromkeys(found) if r not in reviews]
+        reviews.update(dict.fromkeys(new))   # dict: ordered, no duplicates
+        if on_page is not None and new and not on_page(new):
             break
 
-    driver.quit()
+        if not next_url:
+            break
+        current_url = next_url
+
+    return list(reviews)
+
+
+async def _selenium_pages(url: str, max_pages: int) -> AsyncIterator[list]:
+    """
+    Each page's new reviews as soon as the browser (in a worker thread) has
+    scraped it. The thread waits while the previous page is still unclaimed,
+    and stops at the next page once the consumer is gone.
+    """
+    loop = asyncio.get_running_loop()
+    handoff: asyncio.Queue = asyncio.Queue(maxsize=1)
+    stopped = threading.Event()
+    done = object()
+
+    def hand_over(item) -> bool:
+        if stopped.is_set():
+            return False
+        asyncio.run_coroutine_threadsafe(handoff.put(item), loop).result()
+        return not stopped.is_set()
+
+    def scrape():
+        try:
+            with browser() as driver:
+                _scrape_pages(driver, url, max_pages, on_page=hand_over)
+        except Exception as e:
+            hand_over(e)
+        else:
+            hand_over(done)
 
-    return list(dict.fromkeys(reviews))  # remove duplicates
+    producer = asyncio.ensure_future(run_in_threadpool(scrape))
+    try:
+        while True:
+            item = await handoff.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        # unblock a hand-over in progress
+        while not handoff.empty():
+            handoff.get_nowait()
+        producer.add_done_callback(lambda f: f.cancelled() or f.exception())
 
 
 # --------------------------------------------------------------------
-# REQUESTS-BASED SCRAPER (fallback)
+# HTTP SCRAPER (fallback, shared client from app/http_client.py)
 # --------------------------------------------------------------------
-def extract_reviews_requests(url: str):
-    """Fallback simple scraper using requests."""
-    try:
-        res = requests.get(url, headers=HEADERS, timeout=10)
-        if res.status_code != 200:
-            return []
-    except:
-        return []
+async def extract_reviews_requests(url: str, max_pages: int = 1):
+    """
+    Fallback scraper for static pages; known page URLs are fetched
+    concurrently. Raises FetchError if a page could not be fetched, rather
+    than returning the pages before it as if they were all.
+    """
+    urls = page_urls(url, max_pages)
+    pages = await get_many(urls)
 
-    soup = BeautifulSoup(res.text, "html.parser")
     reviews = []
+    for done, (page_url, html) in enumerate(zip(urls, pages)):
+        if isinstance(html, FetchError):
+            if past_last_page(html, done):
+                break
+            raise html
+        found = await run_in_threadpool(extract_reviews, html, page_url)
+        if not found:
+            # past the last page
+            break
+        reviews.extend(found)
 
-    # Amazon
-    for r in soup.select("span.review-text-content"):
-        reviews.append(clean_text(r.get_text(strip=True)))
-
-    # Flipkart
-    for r in soup.select("div._6K-7Co"):
-        reviews.append(clean_text(r.get_text(strip=True)))
-
-    # BestBuy
-    for r in soup.select("p.pre-white-space"):
-        reviews.append(clean_text(r.get_text(strip=True)))
+    return list(dict.fromkeys(reviews))
 
-    # Walmart
-    for r in soup.select("span.review-text"):
-        reviews.append(clean_text(r.get_text(strip=True)))
 
-    return list(dict.fromkeys(reviews))
+async def _http_pages(url: str, max_pages: int) -> AsyncIterator[list]:
+    """
+    extract_reviews_requests page by page: all known page URLs are fetched
+    concurrently, each page is yielded as soon as it and the ones before it
+    have arrived. A page that could not be fetched raises FetchError after
+    the pages before it. Fetches still running when the consumer leaves
+    complete in the background and land in the page cache.
+    """
+    urls = page_urls(url, max_pages)
+    fetches = [asyncio.ensure_future(get_text(u)) for u in urls]
+    seen = set()
+    try:
+        for done, (page_url, fetch) in enumerate(zip(urls, fetches)):
+            try:
+                html = await fetch
+            except FetchError as e:
+                if past_last_page(e, done):
+                    return
+                raise
+            found = await run_in_threadpool(extract_reviews, html, page_url)
+            if not found:
+                # past the last page
+                return
+            new = [r for r in found if r not in seen]
+            seen.update(new)
+            if new:
+                yield new
+    finally:
+        for fetch in fetches:
+            fetch.add_done_callback(lambda f: f.cancelled() or f.exception())
 
 
 # --------------------------------------------------------------------
 # MASTER SCRAPER
 # --------------------------------------------------------------------
-def extract_reviews_from_url(url: str, max_pages: int = 5):
+async def extract_reviews_from_url(url: str, max_pages: int = 5):
     """Decides automatically the best scraping method for the site."""
     url = url.strip()
 
-    # Amazon → use Selenium (pagination)
+    # Amazon → use Selenium (pagination); the browser blocks, so off the loop
     if "amazon" in url:
-        return extract_reviews_selenium(url, max_pages=max_pages)
+        return await cached_reviews(
+            url, f"selenium:{max_pages}",
+            lambda: run_in_threadpool(extract_reviews_selenium, url, max_pages),
+        )
+
+    # Others → plain HTTP
+    return await cached_reviews(url, f"http:{max_pages}", lambda: extract_reviews_requests(url, max_pages))
+
 
-    # Others → requests only
-    return extract_reviews_requests(url)
+def stream_reviews_from_url(url: str, max_pages: int = 5) -> AsyncIterator[list]:
+    """
+    extract_reviews_from_url as an async iterator: each page's new reviews
+    as soon as that page is scraped. Shares the extracted-reviews cache.
+    """
+    url = url.strip()
+    if "amazon" in url:
+        return stream_cached_reviews(url, f"selenium:{max_pages}", lambda: _selenium_pages(url, max_pages))
+    return stream_cached_reviews(url, f"http:{max_pages}", lambda: _http_pages(url, max_pages))
@@ -0,0 +1,115 @@
+"""
+Access-token revocation.
+
+The `revoked_tokens` collection holds two kinds of entries:
+
+    {"jti": ...}                            one token (logout)
+    {"username": ..., "revoked_before": ...}  every token the user was issued
+                                              up to that moment (account deletion)
+
+Every worker mirrors the collection in memory and polls for entries newer
+than the last one it saw, so is_revoked() — called on every authenticated
+request — is a dict lookup with no database round-trip. Entries carry an
+`expires_at` (TTL index) set to when the last token they can match expires.
+A revocation made on another worker takes effect here within
+REVOCATION_REFRESH_SECONDS; on the worker that made it, immediately.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from app.database import async_revoked_tokens_collection
+
+REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+
+# Re-read this much history on each poll so entries committed slightly out
+# of order by other workers are not missed (adds are idempotent)
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+_revoked_jtis: Dict[str, float] = {}       # jti -> expires_at (epoch)
+_revoked_users: Dict[str, tuple] = {}      # username -> (revoked_before, expires_at)
+_last_seen = None
+
+
+def _epoch(dt: datetime) -> float:
+    return (dt - datetime(1970, 1, 1)).total_seconds()
+
+
+def _remember(doc: dict):
+    expires_at = _epoch(doc["expires_at"])
+    if doc.get("jti"):
+        _revoked_jtis[doc["jti"]] = expires_at
+    elif doc.get("username"):
+        before = _epoch(doc["revoked_before"])
+        current = _revoked_users.get(doc["username"])
+        if current is None or current[0] < before:
+            _revoked_users[doc["username"]] = (before, expires_at)
+
+
+def _prune():
+    now = time.time()
+    for jti in [j for j, exp in _revoked_jtis.items() if exp < now]:
+        del _revoked_jtis[jti]
+    for username in [u for u, (_, exp) in _revoked_users.items() if exp < now]:
+        del _revoked_users[username]
+
+
+def is_revoked(payload: dict) -> bool:
+    jti = payload.get("jti")
+    if jti and jti in _revoked_jtis:
+        return True
+
+    entry = _revoked_users.get(payload.get("sub"))
+    if entry is None:
+        return False
+    # tokens without iat predate revocation support: treat as old. iat is
+    # whole seconds, so compare the millisecond issue time where the token
+    # has one; a token from the revocation's own millisecond counts as
+    # revoked (a revocation must cover everything issued before it)
+    issued_ms = payload.get("iat_ms", payload.get("iat", 0) * 1000)
+    return issued_ms <= int(entry[0] * 1000)
+
+
+async def revoke_token(jti: str, expires_at: datetime):
+    doc = {"jti": jti, "expires_at": expires_at, "revoked_at": datetime.utcnow()}
+    _remember(doc)
+    await async_revoked_tokens_collection.insert_one(doc)
+
+
+async def revoke_user(username: str, token_lifetime: timedelta):
+    now = datetime.utcnow()
+    doc = {
+        "username": username,
+        "revoked_before": now,
+        "expires_at": now + token_lifetime,
+        "revoked_at": now,
+    }
+    _remember(doc)
+    await async_revoked_tokens_collection.insert_one(doc)
+
+
+async def refresh():
+    """Pull entries added since the last poll (everything on first call)."""
+    global _last_seen
+
+    query = {"expires_at": {"$gt": datetime.utcnow()}}
+    if _last_seen is not None:
+        query["revoked_at"] = {"$gte": _last_seen - REFRESH_OVERLAP}
+
+    async for doc in async_revoked_tokens_collection.find(query).sort("revoked_at", 1):
+        _remember(doc)
+        _last_seen = doc["revoked_at"]
+
+    _prune()
+
+
+async def run_refresher():
+    """Background task started from the app lifespan."""
+    while True:
+        try:
+            await refresh()
+        except Exception as e:
+            print("Revocation refresh failed:", e)
+        await asyncio.sleep(REFRESH_SECONDS)
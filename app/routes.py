@@ -471,63 +471,132 @@
 #         "neutral": neu,
 #         "reviews": analyzed,
 #     }
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from bson import ObjectId
+from typing import Optional
 from uuid import uuid4
+import asyncio
+import base64
+import csv
+import hashlib
 import io
+import json
 import time
-import pandas as pd
-import matplotlib.pyplot as plt
-from openpyxl import Workbook
 
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+import os
 
 # Database collections
 from app.database import (
+    text_digest,
     collection,
-    users_collection,
-    activity_collection,
-    files_collection,
-    performance_collection
+    performance_collection,
+    async_activity_collection,
+    async_performance_collection
 )
 
 # Auth
-from app.auth import oauth2_scheme, jwt, SECRET_KEY, ALGORITHM
+from app.auth import oauth2_scheme, decode_access_token, get_token_claims, get_user_sync
+from app.models import TokenData
 
 # Blob storage
 from app.blob_service import (
+    BlobNotFound,
     upload_bytes,
     delete_blob,
+    BlobReader,
     download_bytes,
-    list_user_blobs,
-    generate_report_sas
+    download_stream,
+    get_blob_properties,
+    generate_report_sas,
+    supports_direct_urls
 )
 
 # Email service
-from app.email_service import send_azure_email
+from app.email_service import report_ready_message
+from app.email_outbox import queue_email
 
 # Sentiment model
-from app.sentiment_service import analyze_text
+from app.sentiment_service import analyze_text, analyze_many, build_summary, MODEL_NAME
+
+# URL scraping
+from app.review_scraper import SCRAPER_MAX_PAGES, extract_reviews_from_url, stream_reviews_from_url
+from app.browser_pool import BrowserPoolTimeout
+from app.http_client import FetchError
+
+# File catalog (uploaded_files)
+from app import file_catalog
+from app.file_catalog import results_key
 
-# Excel generation
-from openpyxl import Workbook
-from openpyxl.chart import BarChart, Reference
+# Live job progress
+from app import progress
+from app.progress import JobNotFound, JobReporter
 
 router = APIRouter()
 
+# Seconds after which a pending duplicate-detection claim counts as abandoned
+CLAIM_TIMEOUT_SECONDS = int(os.getenv("ANALYSIS_CLAIM_TIMEOUT_SECONDS", "300"))
+
+# GET /analyses paging (keyset on timestamp, _id — see results indexes)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "500"))
+HISTORY_SORT = [("timestamp", -1), ("_id", -1)]
+HISTORY_PROJECTION = {"_id": 1, "text": 1, "label": 1, "score": 1, "timestamp": 1}
+
+# POST /analyses/bulk limits
+BULK_MAX_TEXTS = int(os.getenv("BULK_MAX_TEXTS", "10000"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(20 * 1024 * 1024)))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "32"))
+BULK_MAX_CONCURRENT_BATCHES = int(os.getenv("BULK_MAX_CONCURRENT_BATCHES", "2"))
+
+# Bulk batches in flight on this worker, across all requests
+_bulk_batch_slots = asyncio.Semaphore(BULK_MAX_CONCURRENT_BATCHES)
+
+# GET /files paging (keyset on uploaded_at, _id)
+FILES_PAGE_SIZE = int(os.getenv("FILES_PAGE_SIZE", "50"))
+FILES_MAX_PAGE_SIZE = int(os.getenv("FILES_MAX_PAGE_SIZE", "500"))
+
+# Report downloads: "redirect" to a short-lived SAS URL (default when the
+# blob store can hand one out) or "stream" through this server
+SUMMARY_DOWNLOAD_MODE = os.getenv("SUMMARY_DOWNLOAD_MODE")
+SUMMARY_SAS_MINUTES = int(os.getenv("SUMMARY_SAS_MINUTES", "10"))
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Uploads are read (and hashed) in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Rows scored between progress events for file / URL analyses
+PROGRESS_CHUNK_SIZE = int(os.getenv("PROGRESS_CHUNK_SIZE", "32"))
+
+# POST /analyses/url: scraped reviews waiting for inference, and pages scraped
+URL_QUEUE_SIZE = int(os.getenv("URL_ANALYSIS_QUEUE_SIZE", "256"))
+URL_MAX_PAGES = int(os.getenv("URL_ANALYSIS_MAX_PAGES", "5"))
+
 # -------------------------------------------------------------------------
 # AUTH TOKEN VALIDATION
 # -------------------------------------------------------------------------
 def verify_token(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            raise HTTPException(401, "Invalid token")
-        return username
-    except Exception:
-        raise HTTPException(401, "Invalid token")
+    return decode_access_token(token)["sub"]
+
+
+def _claims_email(claims: TokenData):
+    if claims.email:
+        return claims.email
+    # tokens issued before the email claim existed
+    user_doc = get_user_sync(claims.username)
+    return user_doc["email"] if user_doc else None
+
+
+def _claims_account(claims: TokenData) -> str:
+    # tokens issued before the uid claim existed
+    user_doc = get_user_sync(claims.username)
+    if not user_doc:
+        raise HTTPException(401, "Account not found")
+    return str(user_doc["_id"])
 
 
 # -------------------------------------------------------------------------
@@ -536,18 +605,37 @@ def verify_token(token: str = Depends(oauth2_scheme)):
 @router.post("/files", tags=["Files"])
 async def upload_file(
     file: UploadFile = File(...),
-    username: str = Depends(verify_token)
+    claims: TokenData = Depends(get_token_claims)
 ):
+    username = claims.username
+
     if not file.filename.lower().endswith(".csv"):
         raise HTTPException(400, "Only CSV files allowed")
 
-    data = await file.read()
+    hasher = hashlib.sha256()
+    parts = []
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        parts.append(chunk)
+
+    data = b"".join(parts)
+    sha256 = hasher.hexdigest()
     file_id = str(uuid4())
-    blob_path = f"{username}/uploads/{file_id}.csv"
 
-    upload_bytes(data, blob_path)
+    account = claims.account_id or await run_in_threadpool(_claims_account, claims)
+
+    # identical bytes this account already stored: just take another reference
+    content = await file_catalog.acquire_content(username, account, sha256)
+    deduplicated = content is not None
+    if not deduplicated:
+        row_count = await run_in_threadpool(_count_csv_rows, data)
+        content = await file_catalog.store_content(username, account, sha256, data, row_count=row_count)
+    blob_path = content["blob_path"]
 
-    activity_collection.insert_one({
+    await async_activity_collection.insert_one({
         "username": username,
         "event": "file_uploaded",
         "file_id": file_id,
@@ -557,48 +645,96 @@ async def upload_file(
         "timestamp": datetime.utcnow(),
     })
 
-    user_doc = users_collection.find_one({"username": username})
-    email = user_doc["email"] if user_doc else None
+    email = claims.email or await run_in_threadpool(_claims_email, claims)
+
+    await file_catalog.record_upload(
+        file_id,
+        username,
+        email=email,
+        filename=file.filename,
+        size_bytes=len(data),
+        row_count=content.get("row_count"),
+        blob_path=blob_path,
+        content_sha=sha256,
+        account=account,
+    )
 
-    files_collection.insert_one({
+    return {
+        "message": "Upload successful",
         "file_id": file_id,
-        "username": username,
-        "email": email,
-        "filename": file.filename,
-        "blob_path": blob_path,
-        "size_bytes": len(data),
-        "uploaded_at": datetime.utcnow()
-    })
+        "deduplicated": deduplicated,
+        "cached_results": results_key(MODEL_NAME) in content.get("results", {}),
+    }
+
 
-    return {"message": "Upload successful", "file_id": file_id}
+def _count_csv_rows(data: bytes) -> Optional[int]:
+    """Data rows (header excluded); None if the file isn't parseable CSV."""
+    try:
+        reader = csv.reader(io.StringIO(data.decode("utf-8", errors="replace")))
+        return max(sum(1 for _ in reader) - 1, 0)
+    except csv.Error:
+        return None
 
 
 # -------------------------------------------------------------------------
 # 2️⃣ GET FILE INFO  → GET /files/{file_id}
 # -------------------------------------------------------------------------
 @router.get("/files/{file_id}", tags=["Files"])
-def get_file_info(file_id: str, username: str = Depends(verify_token)):
-    path = f"{username}/uploads/{file_id}.csv"
+async def get_file_info(file_id: str, username: str = Depends(verify_token)):
+    """Metadata from the uploaded_files record — never reads the payload."""
+    record = await file_catalog.get_file(
+        file_id, username,
+        {"_id": 0, "filename": 1, "size_bytes": 1, "row_count": 1, "uploaded_at": 1, "analysis": 1},
+    )
+
+    if record:
+        return {
+            "file_id": file_id,
+            "status": "Available",
+            "filename": record.get("filename"),
+            "size_bytes": record.get("size_bytes"),
+            "row_count": record.get("row_count"),
+            "uploaded_at": record.get("uploaded_at"),
+            "analysis": record.get("analysis") or {"status": "unknown"},
+        }
+
+    # uploads that predate the record: ask the blob store (properties only)
     try:
-        download_bytes(path)
-        return {"file_id": file_id, "status": "Available"}
-    except:
+        props = await get_blob_properties(f"{username}/uploads/{file_id}.csv")
+    except BlobNotFound:
         raise HTTPException(404, "File not found")
 
+    return {
+        "file_id": file_id,
+        "status": "Available",
+        "size_bytes": props["size"],
+        "uploaded_at": props["last_modified"],
+        "analysis": {"status": "unknown"},
+    }
+
 
 # -------------------------------------------------------------------------
 # 3️⃣ DELETE FILE  → DELETE /files/{file_id}
 # -------------------------------------------------------------------------
 @router.delete("/files/{file_id}", tags=["Files"])
-def delete_uploaded_file(file_id: str, username: str = Depends(verify_token)):
-    blob_path = f"{username}/uploads/{file_id}.csv"
-
-    try:
-        delete_blob(blob_path)
-    except:
-        raise HTTPException(404, "File not found")
-
-    activity_collection.insert_one({
+async def delete_uploaded_file(file_id: str, username: str = Depends(verify_token)):
+    record = await file_catalog.get_file(file_id, username, {"blob_path": 1, "content_sha": 1, "account": 1})
+
+    if record and record.get("content_sha"):
+        blob_path = record["blob_path"]
+        if not await file_catalog.mark_deleted(file_id, username):
+            raise HTTPException(404, "File not found")
+        # the blob goes with the last file using it
+        await file_catalog.release_content(username, record.get("account"), record["content_sha"])
+    else:
+        blob_path = file_catalog.upload_path(username, file_id)
+        try:
+            await delete_blob(blob_path)
+        except BlobNotFound:
+            raise HTTPException(404, "File not found")
+        await file_catalog.mark_deleted(file_id, username)
+
+    await async_activity_collection.insert_one({
         "username": username,
         "event": "file_deleted",
         "file_id": file_id,
@@ -613,53 +749,301 @@ def delete_uploaded_file(file_id: str, username: str = Depends(verify_token)):
 # 4️⃣ LIST FILES  → GET /files
 # -------------------------------------------------------------------------
 @router.get("/files", tags=["Files"])
-def list_files(username: str = Depends(verify_token)):
-    upload_blobs = list_user_blobs(f"{username}/uploads/")
-    summary_blobs = list_user_blobs(f"{username}/results/")
+async def list_files(
+    limit: int = Query(FILES_PAGE_SIZE, ge=1, le=FILES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    username: str = Depends(verify_token)
+):
+    """
+    Newest-first uploads and reports from the file catalog. Pass the
+    returned next_cursor back as `cursor` for the following page.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    page = await file_catalog.list_files(username, limit, after)
+    next_cursor = _encode_cursor(page[limit - 1], "uploaded_at") if len(page) > limit else None
+    page = page[:limit]
 
-    uploads = [b.split("/")[-1].replace(".csv", "") for b in upload_blobs]
-    summaries = [b.split("/")[-1].replace("_summary.xlsx", "") for b in summary_blobs]
+    return {
+        "files": [_file_entry(d) for d in page],
+        "uploads": [d["file_id"] for d in page if d.get("has_upload", True)],
+        "summaries": [d["file_id"] for d in page if d.get("has_summary")],
+        "next_cursor": next_cursor
+    }
 
-    return {"uploads": uploads, "summaries": summaries}
+
+def _file_entry(doc: dict) -> dict:
+    return {
+        "file_id": doc["file_id"],
+        "filename": doc.get("filename"),
+        "size_bytes": doc.get("size_bytes"),
+        "row_count": doc.get("row_count"),
+        "uploaded_at": doc.get("uploaded_at"),
+        "has_upload": doc.get("has_upload", True),
+        "has_summary": bool(doc.get("has_summary")),
+        "analysis_status": (doc.get("analysis") or {}).get("status", "unknown"),
+    }
 
 
 # -------------------------------------------------------------------------
 # 5️⃣ ANALYZE TEXT  → POST /analyses
 # -------------------------------------------------------------------------
 @router.post("/analyses", tags=["Analyses"])
-def analyze_text_single(request: dict, username: str = Depends(verify_token)):
+def analyze_text_single(request: dict, claims: TokenData = Depends(get_token_claims)):
+    username = claims.username
     text = request.get("text")
 
-    existing = collection.find_one({"username": username, "text": text})
-    if existing:
+    if not isinstance(text, str) or not text.strip():
+        raise HTTPException(400, "Field 'text' is required")
+
+    result_id = _claim_text(username, text)
+    if result_id is None:
         raise HTTPException(409, "Duplicate: this text already exists")
 
-    result = analyze_text(text)
+    try:
+        result = analyze_text(text)
+    except Exception:
+        # release the claim so the text can be retried
+        collection.delete_one({"_id": result_id, "status": "pending"})
+        raise
+
+    collection.update_one(
+        {"_id": result_id},
+        {
+            "$set": {
+                "email": _claims_email(claims),
+                "label": result["label"],
+                "score": float(result["score"]),
+                "timestamp": datetime.utcnow()
+            },
+            "$unset": {"status": ""}
+        }
+    )
+
+    return result
 
-    user_doc = users_collection.find_one({"username": username})
 
-    collection.insert_one({
-        "username": username,
-        "email": user_doc["email"],
-        "text": text,
-        "label": result["label"],
-        "score": float(result["score"]),
-        "timestamp": datetime.utcnow()
-    })
+def _claim_text(username: str, text: str):
+    """
+    Atomically claim (username, text_digest) before running the model.
+    Returns the claimed result _id, or None if the text is already analysed
+    (or being analysed by a concurrent request).
+    """
+    digest = text_digest(text)
+    now = datetime.utcnow()
 
-    return result
+    try:
+        claim = collection.update_one(
+            {"username": username, "text_digest": digest},
+            {"$setOnInsert": {"text": text, "status": "pending", "timestamp": now}},
+            upsert=True
+        )
+        if claim.upserted_id is not None:
+            return claim.upserted_id
+    except DuplicateKeyError:
+        # a concurrent identical request won the upsert
+        return None
+
+    # Take over a claim abandoned by a request that died mid-inference
+    stale = collection.find_one_and_update(
+        {
+            "username": username,
+            "text_digest": digest,
+            "status": "pending",
+            "timestamp": {"$lt": now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)}
+        },
+        {"$set": {"timestamp": now}},
+        projection={"_id": 1}
+    )
+    return stale["_id"] if stale else None
+
+
+# -------------------------------------------------------------------------
+# 5️⃣b BULK ANALYZE  → POST /analyses/bulk
+# -------------------------------------------------------------------------
+@router.post("/analyses/bulk", tags=["Analyses"])
+async def analyze_bulk(request: Request, username: str = Depends(verify_token)):
+    """
+    Score many texts in one call. The body is either a JSON array or NDJSON
+    (Content-Type: application/x-ndjson, one item per line); each item is a
+    string or {"text": ..., "id": ...}.
+
+    Results stream back as NDJSON, one line per item in input order, then a
+    final {"summary": ...} line. Batches are only scored as the client reads
+    the response, and at most BULK_MAX_CONCURRENT_BATCHES run per worker.
+    Nothing is written to the analysis history.
+    """
+    items = await _read_bulk_items(request)
+
+    return StreamingResponse(
+        _stream_bulk_results(items),
+        media_type="application/x-ndjson"
+    )
+
+
+async def _read_bulk_items(request: Request):
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonl" in content_type
+
+    items = []
+    buffer = bytearray()
+    size = 0
+
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > BULK_MAX_BYTES:
+            raise HTTPException(413, f"Body exceeds {BULK_MAX_BYTES} bytes")
+        buffer += chunk
+
+        if ndjson and b"\n" in buffer:
+            *lines, rest = bytes(buffer).split(b"\n")
+            buffer = bytearray(rest)
+            for line in lines:
+                _add_bulk_line(items, line)
+
+    if ndjson:
+        _add_bulk_line(items, bytes(buffer))
+    else:
+        try:
+            payload = json.loads(bytes(buffer))
+        except ValueError:
+            raise HTTPException(400, "Body must be a JSON array or NDJSON")
+        if not isinstance(payload, list):
+            raise HTTPException(400, "Body must be a JSON array or NDJSON")
+        if len(payload) > BULK_MAX_TEXTS:
+            raise HTTPException(413, f"At most {BULK_MAX_TEXTS} texts per request")
+        items = [_bulk_item(v) for v in payload]
+
+    if not items:
+        raise HTTPException(400, "No texts provided")
+
+    return items
+
+
+def _add_bulk_line(items: list, line: bytes):
+    line = line.strip()
+    if not line:
+        return
+    if len(items) >= BULK_MAX_TEXTS:
+        raise HTTPException(413, f"At most {BULK_MAX_TEXTS} texts per request")
+    try:
+        items.append(_bulk_item(json.loads(line)))
+    except ValueError:
+        items.append((None, None, "Invalid JSON line"))
+
+
+def _bulk_item(value):
+    """Normalise one input item to (id, text, error)."""
+    if isinstance(value, str):
+        return (None, value, None if value.strip() else "Empty text")
+    if isinstance(value, dict) and isinstance(value.get("text"), str):
+        return (value.get("id"), value["text"], None if value["text"].strip() else "Empty text")
+    return (value.get("id") if isinstance(value, dict) else None, None, "Item must be a string or have a 'text' field")
+
+
+async def _stream_bulk_results(items: list):
+    results = []
+
+    for start in range(0, len(items), BULK_BATCH_SIZE):
+        batch = list(enumerate(items[start:start + BULK_BATCH_SIZE], start))
+        valid = [(i, text) for i, (_, text, error) in batch if error is None]
+
+        try:
+            async with _bulk_batch_slots:
+                scored = await run_in_threadpool(analyze_many, [t for _, t in valid]) if valid else []
+        except Exception as e:
+            yield json.dumps({"error": f"Inference failed at item {start}: {e}"}) + "\n"
+            return
+
+        by_index = dict(zip((i for i, _ in valid), scored))
+        lines = []
+        for i, (item_id, _, error) in batch:
+            line = {"index": i}
+            if item_id is not None:
+                line["id"] = item_id
+            if error:
+                line["error"] = error
+            else:
+                line.update(by_index[i])
+                results.append(by_index[i])
+            lines.append(json.dumps(line))
+
+        yield "\n".join(lines) + "\n"
+
+    yield json.dumps({"summary": build_summary(results)}) + "\n"
 
 
 # -------------------------------------------------------------------------
 # 6️⃣ VIEW ANALYSIS HISTORY → GET /analyses
 # -------------------------------------------------------------------------
 @router.get("/analyses", tags=["Analyses"])
-def history(username: str = Depends(verify_token)):
-    docs = list(collection.find(
-        {"username": username},
-        {"_id": 0, "username": 0, "email": 0, "timestamp": 0}
-    ))
-    return {"history": docs}
+def history(
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    label: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    username: str = Depends(verify_token)
+):
+    """
+    Newest-first analysis history, one page at a time. Pass the returned
+    next_cursor back as `cursor` for the following page. format=ndjson
+    streams every matching entry (from `cursor` on, ignoring `limit`).
+    """
+    query = {"username": username, "status": {"$exists": False}}
+    if label:
+        query["label"] = label.upper()
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+    if cursor:
+        ts, last_id = _decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"timestamp": {"$lt": ts}},
+            {"timestamp": ts, "_id": {"$lt": last_id}}
+        ]}]}
+
+    docs = collection.find(query, HISTORY_PROJECTION).sort(HISTORY_SORT)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            (json.dumps(_history_entry(d)) + "\n" for d in docs.batch_size(500)),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": "attachment; filename=history.ndjson"}
+        )
+
+    page = list(docs.limit(limit + 1))
+    next_cursor = _encode_cursor(page[limit - 1]) if len(page) > limit else None
+
+    return {
+        "history": [_history_entry(d) for d in page[:limit]],
+        "next_cursor": next_cursor
+    }
+
+
+def _history_entry(doc: dict) -> dict:
+    return {
+        "text": doc.get("text"),
+        "label": doc.get("label"),
+        "score": doc.get("score"),
+        "timestamp": doc["timestamp"].isoformat() if doc.get("timestamp") else None
+    }
+
+
+def _encode_cursor(doc: dict, field: str = "timestamp") -> str:
+    raw = json.dumps([doc[field].isoformat(), str(doc["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        ts, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(ts), ObjectId(last_id)
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
 
 
 # -------------------------------------------------------------------------
@@ -667,7 +1051,10 @@ def history(username: str = Depends(verify_token)):
 # -------------------------------------------------------------------------
 @router.delete("/analyses/text", tags=["Analyses"])
 def delete_text(text: str, username: str = Depends(verify_token)):
-    result = collection.delete_one({"username": username, "text": text})
+    result = collection.delete_one({"username": username, "text_digest": text_digest(text)})
+    if result.deleted_count == 0:
+        # rows stored before text digests existed
+        result = collection.delete_one({"username": username, "text": text})
     if result.deleted_count == 0:
         raise HTTPException(404, "Text not found")
     return {"message": "Text deleted", "text": text}
@@ -677,46 +1064,162 @@ def delete_text(text: str, username: str = Depends(verify_token)):
 # 8️⃣ ANALYZE FILE → POST /analyses/file/{file_id}
 # -------------------------------------------------------------------------
 @router.post("/analyses/file/{file_id}", tags=["Analyses"])
-def analyze_uploaded_file(file_id: str, username: str = Depends(verify_token)):
+async def analyze_uploaded_file(
+    file_id: str,
+    job_id: Optional[str] = None,
+    claims: TokenData = Depends(get_token_claims)
+):
+    """
+    Score every row of an uploaded CSV and build the Excel report. Progress
+    is pushed per chunk to GET /analyses/jobs/{job_id}/events (job_id
+    defaults to the file_id).
+    """
+    username = claims.username
+    job_id = job_id or file_id
+    _check_job_id(job_id, username)
 
     start = time.time()
-    csv_path = f"{username}/uploads/{file_id}.csv"
+    record = await file_catalog.get_file(file_id, username, {"blob_path": 1, "content_sha": 1, "account": 1}) or {}
+    csv_path = record.get("blob_path") or file_catalog.upload_path(username, file_id)
+    sha256 = record.get("content_sha")
+    account = record.get("account")
+
+    with JobReporter(job_id, username) as job:
+        # same bytes already scored by this model: skip inference
+        cached = await _load_cached_results(username, account, sha256)
+
+        if cached is None:
+            # decoded chunk by chunk while pandas parses it (see BlobReader)
+            try:
+                chunks = await download_stream(csv_path)
+            except BlobNotFound:
+                raise HTTPException(404, "CSV not found")
+
+        started_at = datetime.utcnow()
+        await file_catalog.record_analysis(file_id, username, status="running", job_id=job_id, started_at=started_at)
+        try:
+            # parsing, inference and the workbook are CPU work: keep them off the loop
+            if cached is None:
+                results = await run_in_threadpool(_score_csv, BlobReader(chunks), job)
+            else:
+                results = cached
+                _replay_progress(results, job)
+            summary, excel_bytes = await run_in_threadpool(_summarize_results, file_id, results)
+        except Exception as e:
+            await file_catalog.record_analysis(
+                file_id, username, status="failed", job_id=job_id, started_at=started_at,
+                error=getattr(e, "detail", None) or str(e), finished_at=datetime.utcnow()
+            )
+            raise
+        total = summary["total"]
+
+        if cached is None and sha256:
+            payload = await run_in_threadpool(lambda: json.dumps(results).encode("utf-8"))
+            await file_catalog.store_results(username, account, sha256, MODEL_NAME, payload)
+
+        summary_blob = file_catalog.summary_path(username, file_id)
+        await upload_bytes(excel_bytes, summary_blob)
+        await file_catalog.record_summary(file_id, username)
+
+        email = claims.email or await run_in_threadpool(_claims_email, claims)
+        if email:
+            sas = generate_report_sas(summary_blob)
+            await queue_email(email, *report_ready_message(sas), dedupe_key=f"report:{username}:{file_id}")
+
+        await async_activity_collection.insert_one({
+            "username": username,
+            "event": "file_analyzed",
+            "file_id": file_id,
+            "timestamp": datetime.utcnow()
+        })
 
+        latency = round((time.time() - start) * 1000, 3)
+        await async_performance_collection.insert_one({
+            "type": "file_analysis_latency",
+            "username": username,
+            "file_id": file_id,
+            "total_rows": total,
+            "latency_ms": latency,
+            "timestamp": datetime.utcnow()
+        })
+
+        await file_catalog.record_analysis(
+            file_id, username, status="complete", job_id=job_id, started_at=started_at,
+            summary=summary, finished_at=datetime.utcnow()
+        )
+        job.complete(summary)
+
+    return {
+        "message": "Analysis complete",
+        "file_id": file_id,
+        "latency_ms": latency,
+        "reused_results": cached is not None
+    }
+
+
+async def _load_cached_results(username: str, account: Optional[str], sha256: Optional[str]):
+    if not sha256:
+        return None
+    path = await file_catalog.cached_results_path(username, account, sha256, MODEL_NAME)
+    if not path:
+        return None
     try:
-        bytes_data = download_bytes(csv_path)
-    except:
-        raise HTTPException(404, "CSV not found")
+        return json.loads(await download_bytes(path))
+    except BlobNotFound:
+        return None
+
 
-    df = pd.read_csv(io.BytesIO(bytes_data))
+def _replay_progress(results: list, job: JobReporter):
+    job.set_total(len(results))
+    for i in range(0, len(results), PROGRESS_CHUNK_SIZE):
+        job.progress(results[i:i + PROGRESS_CHUNK_SIZE])
+
+
+def _score_csv(csv_file, job: JobReporter) -> list:
+    import pandas as pd
+
+    df = pd.read_csv(csv_file)
 
     if "text" not in df.columns:
         raise HTTPException(400, "CSV must contain 'text' column")
 
     texts = df["text"].dropna().tolist()
+    job.set_total(len(texts))
 
+    return _score_in_chunks(texts, job)
+
+
+def _summarize_results(file_id: str, results: list):
+    summary = build_summary(results)
+    excel_bytes = _build_excel_report(
+        file_id, results, summary["positive"], summary["negative"], summary["neutral"]
+    )
+    return summary, excel_bytes
+
+
+def _score_in_chunks(texts: list, job: JobReporter, key: str = "text") -> list:
+    """Batched inference that reports every PROGRESS_CHUNK_SIZE rows."""
     results = []
-    pos = neg = neu = 0
+    for i in range(0, len(texts), PROGRESS_CHUNK_SIZE):
+        scored = _score_batch(texts[i:i + PROGRESS_CHUNK_SIZE], key)
+        results.extend(scored)
+        job.progress(scored)
+    return results
 
-    for t in texts:
-        res = analyze_text(t)
-        label = res["label"]
 
-        if label == "POSITIVE":
-            pos += 1
-        elif label == "NEGATIVE":
-            neg += 1
-        else:
-            neu += 1
+def _score_batch(texts: list, key: str = "text") -> list:
+    return [
+        {key: t, "label": r["label"], "score": r["score"]}
+        for t, r in zip(texts, analyze_many(texts))
+    ]
 
-        results.append({
-            "text": t,
-            "label": label,
-            "score": float(res["score"])
-        })
+
+def _build_excel_report(file_id: str, results: list, pos: int, neg: int, neu: int) -> bytes:
+    from openpyxl import Workbook
+    from openpyxl.chart import BarChart, Reference
 
     total = len(results)
 
-    # Excel report generation
     wb = Workbook()
     ws = wb.active
     ws.title = "Report Summary"
@@ -754,74 +1257,149 @@ def analyze_uploaded_file(file_id: str, username: str = Depends(verify_token)):
 
     stream = io.BytesIO()
     wb.save(stream)
-    stream.seek(0)
+    return stream.getvalue()
 
-    summary_blob = f"{username}/results/{file_id}_summary.xlsx"
-    upload_bytes(stream.read(), summary_blob)
 
-    user_doc = users_collection.find_one({"username": username})
-    if user_doc:
-        sas = generate_report_sas(summary_blob)
-        send_azure_email(
-            to_email=user_doc["email"],
-            subject="Sentiment Report Ready",
-            body=f"Your report is ready.\nDownload: {sas}"
-        )
+def _check_job_id(job_id: str, username: str):
+    """Claim `job_id` for this user's analysis (409 if another user has it)."""
+    try:
+        progress.claim(job_id, username)
+    except JobNotFound:
+        raise HTTPException(409, "job_id is already in use")
 
-    activity_collection.insert_one({
-        "username": username,
-        "event": "file_analyzed",
-        "file_id": file_id,
-        "timestamp": datetime.utcnow()
-    })
 
-    latency = round((time.time() - start) * 1000, 3)
-    performance_collection.insert_one({
-        "type": "file_analysis_latency",
-        "username": username,
-        "file_id": file_id,
-        "latency_ms": latency,
-        "timestamp": datetime.utcnow()
-    })
+# -------------------------------------------------------------------------
+# 8️⃣b JOB PROGRESS (SSE) → GET /analyses/jobs/{job_id}/events
+# -------------------------------------------------------------------------
+@router.get("/analyses/jobs/{job_id}/events", tags=["Analyses"])
+async def job_events(job_id: str, username: str = Depends(verify_token)):
+    """
+    Server-Sent Events for a file or URL analysis: a snapshot first, then
+    `progress` events (running counts + that chunk's results) and finally
+    `complete` (with the summary) or `failed`. May be opened before the
+    analysis request is sent.
+    """
+    # the first event (the snapshot) registers the subscription, so the
+    # ownership check happens here rather than once the response has started
+    events = progress.subscribe(job_id, username)
+    try:
+        snapshot = await events.__anext__()
+    except JobNotFound:
+        raise HTTPException(404, "Job not found")
+
+    async def stream():
+        try:
+            yield _sse(snapshot)
+            async for event in events:
+                yield ": keep-alive\n\n" if event is None else _sse(event)
+        finally:
+            await events.aclose()
 
-    return {
-        "message": "Analysis complete",
-        "file_id": file_id,
-        "latency_ms": latency
-    }
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
 
 
 # -------------------------------------------------------------------------
 # 9️⃣ DOWNLOAD SUMMARY → GET /analyses/{file_id}/summary
 # -------------------------------------------------------------------------
 @router.get("/analyses/{file_id}/summary", tags=["Analyses"])
-def download_summary(file_id: str, username: str = Depends(verify_token)):
+async def download_summary(
+    request: Request,
+    file_id: str,
+    mode: Optional[str] = Query(None, pattern="^(redirect|stream)$"),
+    username: str = Depends(verify_token)
+):
+    """
+    mode=redirect (default where available): 307 to a short-lived SAS URL,
+    so the file never passes through the API. mode=stream: proxied in
+    chunks, with single-range `Range: bytes=...` support (206).
+    """
+    blob = file_catalog.summary_path(username, file_id)
+    filename = f"{file_id}_summary.xlsx"
+
+    mode = mode or SUMMARY_DOWNLOAD_MODE or ("redirect" if supports_direct_urls() else "stream")
+    if mode == "redirect" and not supports_direct_urls():
+        raise HTTPException(400, "Redirect downloads are not available on this server")
+
+    if mode == "redirect":
+        if not await file_catalog.has_summary(file_id, username):
+            # reports written before the catalog tracked them
+            try:
+                await get_blob_properties(blob)
+            except BlobNotFound:
+                raise HTTPException(404, "Summary not found")
+        url = generate_report_sas(blob, SUMMARY_SAS_MINUTES, filename)
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
 
-    blob = f"{username}/results/{file_id}_summary.xlsx"
     try:
-        data = download_bytes(blob)
-    except:
+        size = (await get_blob_properties(blob))["size"]
+    except BlobNotFound:
         raise HTTPException(404, "Summary not found")
 
-    return StreamingResponse(
-        io.BytesIO(data),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={file_id}_summary.xlsx"}
-    )
+    headers = {"Content-Disposition": f"attachment; filename={filename}", "Accept-Ranges": "bytes"}
+    byte_range = _parse_range(request.headers.get("range"), size)
+
+    if byte_range is None:
+        start, length, status_code = 0, size, 200
+    else:
+        start, end = byte_range
+        length, status_code = end - start + 1, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    try:
+        chunks = await download_stream(blob, start, length)
+    except BlobNotFound:
+        raise HTTPException(404, "Summary not found")
+
+    return StreamingResponse(chunks, status_code=status_code, media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+
+def _parse_range(header: Optional[str], size: int):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to serve the
+    whole file (no header, multiple ranges, other units).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # suffix range: the last N bytes
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+
+    if start > end or start >= size:
+        raise HTTPException(416, "Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
 
 
 # -------------------------------------------------------------------------
 # 🔟 DELETE SUMMARY → DELETE /analyses/{file_id}/summary
 # -------------------------------------------------------------------------
 @router.delete("/analyses/{file_id}/summary", tags=["Analyses"])
-def delete_summary(file_id: str, username: str = Depends(verify_token)):
+async def delete_summary(file_id: str, username: str = Depends(verify_token)):
 
-    blob = f"{username}/results/{file_id}_summary.xlsx"
+    blob = file_catalog.summary_path(username, file_id)
     try:
-        delete_blob(blob)
-    except:
+        await delete_blob(blob)
+    except BlobNotFound:
         raise HTTPException(404, "Summary not found")
 
+    await file_catalog.record_summary(file_id, username, exists=False)
+
     return {"message": "Summary deleted", "file_id": file_id}
 
 
@@ -838,6 +1416,8 @@ def performance_violin(username: str = Depends(verify_token)):
 
     latencies = [d["latency_ms"] for d in docs]
 
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(7, 5))
     plt.violinplot(latencies, showmeans=True, showmedians=True)
     plt.title("Global File Analysis Latency (ms)")
@@ -854,68 +1434,175 @@ def performance_violin(username: str = Depends(verify_token)):
 # -------------------------------------------------------------------------
 # 1️⃣2️⃣ URL REVIEW ANALYSIS → POST /analyses/url
 # -------------------------------------------------------------------------
+def _scrapers_busy() -> HTTPException:
+    return HTTPException(503, "All scraping browsers are busy, try again shortly", headers={"Retry-After": "10"})
+
+
+def _fetch_failed(e: FetchError) -> HTTPException:
+    return HTTPException(502, f"Could not fetch the review pages ({e})")
+
+
+async def _scrape_reviews(url: str, max_pages: int = 5) -> list:
+    try:
+        return await extract_reviews_from_url(url, max_pages)
+    except BrowserPoolTimeout:
+        raise _scrapers_busy()
+    except FetchError as e:
+        raise _fetch_failed(e)
+
+
 @router.post("/analyses/url", tags=["Analyses"])
-def analyze_from_url(url: str, username: str = Depends(verify_token)):
+async def analyze_from_url(
+    url: str,
+    job_id: Optional[str] = None,
+    stream: bool = False,
+    username: str = Depends(verify_token)
+):
+    """
+    Scrape reviews from `url` and score them. Reviews are scored in batches
+    while later pages are still being scraped. Pass a client-generated job_id
+    to follow progress on GET /analyses/jobs/{job_id}/events.
+
+    With stream=true the response is NDJSON: a {"results": [...]} line per
+    scored batch as soon as it is ready, then a final {"summary": ...} line
+    (or an {"error": ...} line).
+    """
+    job_id = job_id or str(uuid4())
+    _check_job_id(job_id, username)
+
+    if stream:
+        return StreamingResponse(
+            _stream_url_analysis(url, job_id, username),
+            media_type="application/x-ndjson"
+        )
 
-    reviews = extract_reviews_from_url(url)
+    with JobReporter(job_id, username) as job:
+        analyzed = []
+        async for scored in _score_url_reviews(url, job):
+            analyzed.extend(scored)
 
-    if not reviews:
-        raise HTTPException(400, "Could not extract reviews")
+        if not analyzed:
+            raise HTTPException(400, "Could not extract reviews")
 
-    analyzed = []
-    pos = neg = neu = 0
+        summary = await _finish_url_analysis(url, username, analyzed, job)
 
-    for rev in reviews:
-        res = analyze_text(rev)
-        label = res["label"].upper()
+    return {
+        "message": "URL analysis complete",
+        "job_id": job_id,
+        "total_reviews": summary["total"],
+        "positive": summary["positive"],
+        "negative": summary["negative"],
+        "neutral": summary["neutral"],
+        "reviews": analyzed
+    }
 
-        if label.startswith("POS"):
-            pos += 1
-        elif label.startswith("NEG"):
-            neg += 1
-        else:
-            neu += 1
 
-        analyzed.append({
-            "review": rev,
-            "label": label,
-            "score": float(res["score"])
-        })
+async def _stream_url_analysis(url: str, job_id: str, username: str):
+    with JobReporter(job_id, username) as job:
+        analyzed = []
+        try:
+            async for scored in _score_url_reviews(url, job):
+                analyzed.extend(scored)
+                yield json.dumps({"results": scored}) + "\n"
+
+            if not analyzed:
+                raise HTTPException(400, "Could not extract reviews")
+
+            summary = await _finish_url_analysis(url, username, analyzed, job)
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            job.fail(error)
+            yield json.dumps({"error": error, "job_id": job_id}) + "\n"
+            return
+
+    yield json.dumps({"job_id": job_id, "summary": summary}) + "\n"
+
+
+_SCRAPE_DONE = object()
 
-    total = len(analyzed)
 
-    activity_collection.insert_one({
+async def _scrape_into(queue: asyncio.Queue, url: str):
+    """Producer: scraped reviews into `queue`, then _SCRAPE_DONE (or the error)."""
+    pages = stream_reviews_from_url(url, URL_MAX_PAGES)
+    try:
+        async for page in pages:
+            for review in page:
+                await queue.put(review)
+    except Exception as e:
+        await queue.put(e)
+        return
+    finally:
+        await pages.aclose()
+    await queue.put(_SCRAPE_DONE)
+
+
+async def _score_url_reviews(url: str, job: JobReporter):
+    """
+    Consumer: yields scored batches while the scraper keeps filling a
+    bounded queue. Each batch is whatever has queued up since the last one
+    (at most PROGRESS_CHUNK_SIZE reviews), so inference never waits for a
+    batch to fill and a slow model holds the scraper back instead of
+    letting reviews pile up.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=URL_QUEUE_SIZE)
+    producer = asyncio.ensure_future(_scrape_into(queue, url))
+    try:
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            while len(batch) < PROGRESS_CHUNK_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            # the producer's last item is _SCRAPE_DONE or its error
+            reviews = [item for item in batch if isinstance(item, str)]
+            last = batch[-1]
+            finished = not isinstance(last, str)
+
+            # reviews scraped before a failure are still scored and yielded
+            if reviews:
+                scored = await run_in_threadpool(_score_batch, reviews, "review")
+                job.progress(scored)
+                yield scored
+
+            if isinstance(last, BrowserPoolTimeout):
+                raise _scrapers_busy()
+            if isinstance(last, FetchError):
+                raise _fetch_failed(last)
+            if isinstance(last, Exception):
+                raise last
+    finally:
+        producer.cancel()
+
+
+async def _finish_url_analysis(url: str, username: str, analyzed: list, job: JobReporter) -> dict:
+    job.set_total(len(analyzed))
+    summary = build_summary(analyzed)
+
+    await async_activity_collection.insert_one({
         "username": username,
         "event": "url_analyzed",
         "url": url,
-        "total_reviews": total,
-        "positive": pos,
-        "negative": neg,
-        "neutral": neu,
+        "total_reviews": summary["total"],
+        "positive": summary["positive"],
+        "negative": summary["negative"],
+        "neutral": summary["neutral"],
         "timestamp": datetime.utcnow(),
     })
 
-    return {
-        "message": "URL analysis complete",
-        "total_reviews": total,
-        "positive": pos,
-        "negative": neg,
-        "neutral": neu,
-        "reviews": analyzed
-    }
-from app.review_scraper import extract_reviews_from_url
+    job.complete(summary)
+    return summary
 from fastapi.responses import StreamingResponse
 import csv
 import io
 
 @router.post("/reviews/extract", tags=["Review Extraction"])
-def extract_reviews_to_excel(
+async def extract_reviews_to_excel(
     url: str,
-    max_pages: int = 5,
+    max_pages: int = Query(5, ge=1, le=SCRAPER_MAX_PAGES),
     username: str = Depends(verify_token)
 ):
 
-    reviews = extract_reviews_from_url(url, max_pages)
+    reviews = await _scrape_reviews(url, max_pages)
 
     if not reviews:
         raise HTTPException(400, "No reviews found across pages.")
@@ -0,0 +1,314 @@
+"""
+Cache for scraped pages and the reviews extracted from them.
+
+    html = await get_text(url)                   # drop-in for http_client.get_text
+    pages = await get_many(urls)
+    reviews = await cached_reviews(url, "selenium:5", scrape)
+    async for page in stream_cached_reviews(url, "selenium:5", scrape_pages):
+
+Pages are keyed by normalised URL (the page number is part of the query).
+An entry is served as-is for SCRAPE_CACHE_TTL_SECONDS. After that it is
+revalidated: if the site sent an ETag / Last-Modified, the refetch is a
+conditional request and a 304 just extends the entry. Entries are dropped
+SCRAPE_CACHE_RETENTION_SECONDS after their last refresh. Concurrent misses
+for the same key in one worker share a single fetch.
+
+The extracted review list is cached too (SCRAPE_CACHE_REVIEWS, on by
+default), so a repeated analysis skips fetching and parsing altogether -
+including Selenium scrapes, which have no HTTP cache to revalidate.
+
+SCRAPE_CACHE_BACKEND selects the store:
+    mongo   `scrape_cache` collection, shared by all workers (default)
+    disk    one file per entry under SCRAPE_CACHE_DIR, per machine
+    none    no caching
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+
+from app import http_client
+from app.http_client import FetchError
+
+SCRAPE_CACHE_BACKEND = os.getenv("SCRAPE_CACHE_BACKEND", "mongo")
+TTL_SECONDS = int(os.getenv("SCRAPE_CACHE_TTL_SECONDS", "900"))
+RETENTION_SECONDS = int(os.getenv("SCRAPE_CACHE_RETENTION_SECONDS", "86400"))
+CACHE_REVIEWS = os.getenv("SCRAPE_CACHE_REVIEWS", "1") == "1"
+CACHE_DIR = Path(os.getenv("SCRAPE_CACHE_DIR", "/tmp/scrape-cache"))
+
+# Compressed entries above this are not stored (Mongo documents max out at 16 MB)
+MAX_ENTRY_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024)))
+
+# Never part of the key: tracking noise, and credentials of proxy APIs
+IGNORED_PARAMS = {"api_key", "ref", "ref_", "tag", "fbclid", "gclid"}
+
+
+def normalize_url(url: str) -> str:
+    """Lower-case scheme and host, no fragment, sorted query without tracking params."""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in IGNORED_PARAMS and not k.startswith("utm_")
+    )
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path or "/",
+        urlencode(query),
+        "",
+    ))
+
+
+def _key(kind: str, *parts: str) -> str:
+    return f"{kind}:" + hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def _dumps(entry: dict) -> bytes:
+    return zlib.compress(json.dumps(entry).encode("utf-8"), 6)
+
+
+def _loads(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+# -------------------------------------------------
+# STORES
+# -------------------------------------------------
+class MongoStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, key: str) -> Optional[dict]:
+        doc = await self.collection.find_one({"_id": key})
+        return _loads(doc["data"]) if doc else None
+
+    async def put(self, key: str, data: bytes):
+        await self.collection.replace_one(
+            {"_id": key},
+            {"data": data, "expires_at": datetime.utcnow() + timedelta(seconds=RETENTION_SECONDS)},
+            upsert=True,
+        )
+
+
+class DiskStore:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, key: str) -> Path:
+        kind, _, digest = key.partition(":")
+        return self.root / kind / digest[:2] / f"{digest}.z"
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > RETENTION_SECONDS:
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{uuid4().hex[:12]}.part")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    async def get(self, key: str) -> Optional[dict]:
+        data = await run_in_threadpool(self._read, key)
+        return _loads(data) if data else None
+
+    async def put(self, key: str, data: bytes):
+        await run_in_threadpool(self._write, key, data)
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None and SCRAPE_CACHE_BACKEND != "none":
+        if SCRAPE_CACHE_BACKEND == "disk":
+            _store = DiskStore(CACHE_DIR)
+        else:
+            from app.database import async_scrape_cache_collection
+
+            _store = MongoStore(async_scrape_cache_collection)
+    return _store
+
+
+async def _get(key: str) -> Optional[dict]:
+    try:
+        return await get_store().get(key)
+    except Exception as e:
+        # a cache failure only costs a fetch
+        print("Scrape cache read failed:", e)
+        return None
+
+
+async def _put(key: str, entry: dict):
+    try:
+        data = _dumps(entry)
+        if len(data) <= MAX_ENTRY_BYTES:
+            await get_store().put(key, data)
+    except Exception as e:
+        print("Scrape cache write failed:", e)
+
+
+# -------------------------------------------------
+# PAGES
+# -------------------------------------------------
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def _single_flight(key: str, load: Callable[[], Awaitable]):
+    """
+    Run `load` once per key at a time in this worker; others await its
+    result. If the loading request is cancelled (its client left), a waiting
+    one takes over the load instead of failing with it.
+    """
+    while True:
+        pending = _inflight.get(key)
+        if pending is None:
+            break
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                # this request itself was cancelled
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await load()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()    # retrieved: no "never retrieved" warning without waiters
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del _inflight[key]
+
+
+async def _load_page(key: str, url: str, **kwargs) -> str:
+    entry = await _get(key)
+    now = time.time()
+    if entry and entry["fresh_until"] > now:
+        return entry["body"]
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = await http_client.fetch(url, headers=headers or None, **kwargs)
+    if response.status == 304 and entry:
+        entry["fresh_until"] = now + TTL_SECONDS
+        await _put(key, entry)
+        return entry["body"]
+
+    body = response.text or ""
+    await _put(key, {
+        "url": normalize_url(url),
+        "body": body,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fresh_until": now + TTL_SECONDS,
+    })
+    return body
+
+
+async def get_text(url: str, **kwargs) -> str:
+    """http_client.get_text through the cache."""
+    if get_store() is None:
+        return await http_client.get_text(url, **kwargs)
+    key = _key("page", normalize_url(url))
+    return await _single_flight(key, lambda: _load_page(key, url, **kwargs))
+
+
+async def get_many(urls: List[str], **kwargs) -> List[Union[str, FetchError]]:
+    """http_client.get_many through the cache."""
+    async def one(url):
+        try:
+            return await get_text(url, **kwargs)
+        except FetchError as e:
+            return e
+
+    return await asyncio.gather(*(one(url) for url in urls))
+
+
+# -------------------------------------------------
+# EXTRACTED REVIEWS
+# -------------------------------------------------
+async def cached_reviews(url: str, variant: str, scrape: Callable[[], Awaitable[list]]) -> list:
+    """
+    `scrape()`'s result for (url, variant), reused for SCRAPE_CACHE_TTL_SECONDS.
+    `variant` names whatever changes the result (scraper, page count, ...).
+    Empty results are not cached.
+    """
+    if not CACHE_REVIEWS or get_store() is None:
+        return await scrape()
+
+    key = _key("reviews", normalize_url(url), variant)
+
+    async def load():
+        entry = await _get(key)
+        if entry and entry["fresh_until"] > time.time():
+            return entry["reviews"]
+        reviews = await scrape()
+        if reviews:
+            await _put(key, {"url": normalize_url(url), "reviews": reviews, "fresh_until": time.time() + TTL_SECONDS})
+        return reviews
+
+    return await _single_flight(key, load)
+
+
+async def stream_cached_reviews(
+    url: str, variant: str, scrape_pages: Callable[[], AsyncIterator[list]]
+) -> AsyncIterator[list]:
+    """
+    cached_reviews for page-by-page scrapers, sharing its entries. A fresh
+    entry comes out as a single batch; otherwise `scrape_pages()`'s batches
+    pass straight through and their concatenation is stored once the scrape
+    has finished. An abandoned scrape is not stored.
+    """
+    if not CACHE_REVIEWS or get_store() is None:
+        async for page in scrape_pages():
+            yield page
+        return
+
+    key = _key("reviews", normalize_url(url), variant)
+    entry = await _get(key)
+    if entry and entry["fresh_until"] > time.time():
+        if entry["reviews"]:
+            yield entry["reviews"]
+        return
+
+    reviews = []
+    pages = scrape_pages()
+    try:
+        async for page in pages:
+            reviews.extend(page)
+            yield page
+    finally:
+        await pages.aclose()
+
+    if reviews:
+        await _put(key, {"url": normalize_url(url), "reviews": reviews, "fresh_until": time.time() + TTL_SECONDS})
@@ -1,12 +1,18 @@
-from transformers import pipeline, AutoTokenizer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import os
 
 
 sentiment_model = None
 tokenizer = None
 
+# Hub id or a local directory (e.g. a tiny model saved for offline benchmarks)
+MODEL_NAME = os.getenv("SENTIMENT_MODEL_NAME", "cardiffnlp/twitter-xlm-roberta-base-sentiment")
+
 MAX_TOKENS = 250   # prevent model crash
 
+# Texts per forward pass in analyze_many
+BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "8"))
+
 
 def normalize_label(label: str) -> str:
     label = label.lower()
@@ -24,12 +30,13 @@ def normalize_label(label: str) -> str:
 def get_model():
     global sentiment_model, tokenizer
     if sentiment_model is None:
-        model_name = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
+        # transformers pulls in torch: only pay for it when a model is needed
+        from transformers import pipeline, AutoTokenizer
 
-        tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=False)
         sentiment_model = pipeline(
             "sentiment-analysis",
-            model=model_name,
+            model=MODEL_NAME,
             tokenizer=tokenizer
         )
 
@@ -71,7 +78,7 @@ def analyze_text(text: str) -> Dict[str, Any]:
     }
 
 
-def analyze_many(texts: List[str]) -> List[Dict[str, Any]]:
+def analyze_many(texts: List[str], batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     SAFE BATCH PROCESSING FOR CSV FILES
     """
@@ -83,7 +90,7 @@ def analyze_many(texts: List[str]) -> List[Dict[str, Any]]:
     # 👇 PREVENT CRASH BY TRUNCATING ALL TEXTS FIRST
     cleaned = [_truncate_text(t) for t in texts]
 
-    outputs = model(cleaned)
+    outputs = model(cleaned, batch_size=batch_size or BATCH_SIZE)
 
     return [
         {
@@ -0,0 +1,340 @@
+"""
+End-to-end load benchmark for the Cloud Sentiment API.
+
+By default the app runs in-process against the local stand-ins from
+benchmarks/standins.py (mongomock, filesystem blobs, email sink, stub model),
+so a run needs no network and no Azure account. Pass --base-url to drive a
+live deployment instead.
+
+Every virtual user goes through the same phases:
+
+    auth.register  POST /auth/users
+    auth.verify    POST /auth/verify/manual
+    auth.login     POST /auth/token
+    files.upload   POST /files                      (--rows rows per CSV)
+    analyses.text  POST /analyses                   (--texts requests per user)
+    analyses.file  POST /analyses/file/{file_id}
+
+Each phase runs with at most --concurrency requests in flight and reports
+throughput plus p50/p95/p99 latency. Results are written as JSON so runs of
+different versions can be compared:
+
+    python -m benchmarks.api_bench --users 20 --concurrency 8 --texts 50 --rows 500
+    python -m benchmarks.api_bench --compare benchmarks/results/api-<previous>.json
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+WORDS = {
+    "positive": ["great", "excellent", "love", "perfect", "amazing", "fast", "reliable"],
+    "negative": ["broken", "terrible", "slow", "refund", "awful", "disappointed", "cheap"],
+    "neutral": ["product", "delivery", "box", "battery", "screen", "price", "size", "colour"],
+}
+
+
+# ---------------------------------------------------------
+# CORPUS
+# ---------------------------------------------------------
+def make_corpus(size: int, seed: int, min_words: int = 8, max_words: int = 60):
+    rng = random.Random(seed)
+    vocab = [w for words in WORDS.values() for w in words]
+    return [
+        " ".join(rng.choice(vocab) for _ in range(rng.randint(min_words, max_words)))
+        for _ in range(size)
+    ]
+
+
+def load_corpus(path: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f) if row.get("text")]
+
+
+def to_csv(texts):
+    stream = io.StringIO()
+    writer = csv.writer(stream)
+    writer.writerow(["text"])
+    for t in texts:
+        writer.writerow([t])
+    return stream.getvalue().encode("utf-8")
+
+
+# ---------------------------------------------------------
+# STATS
+# ---------------------------------------------------------
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies_ms, errors: int, duration_s: float):
+    values = sorted(latencies_ms)
+    count = len(values)
+    return {
+        "count": count,
+        "errors": errors,
+        "duration_s": round(duration_s, 4),
+        "throughput_rps": round(count / duration_s, 2) if duration_s else 0.0,
+        "mean_ms": round(sum(values) / count, 3) if count else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+async def run_phase(name, jobs, concurrency: int):
+    """
+    Run `jobs` (zero-arg coroutine factories returning an httpx.Response)
+    with at most `concurrency` in flight. Returns (summary, responses).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(job):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await job()
+            except Exception as e:
+                errors += 1
+                print(f"[{name}] request failed: {e!r}", file=sys.stderr)
+                return None
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+                print(f"[{name}] HTTP {response.status_code}: {response.text[:200]}", file=sys.stderr)
+            return response
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(one(job) for job in jobs))
+    summary = summarize(latencies, errors, time.perf_counter() - start)
+    print(
+        f"{name:<15} n={summary['count']:<6} err={summary['errors']:<4} "
+        f"{summary['throughput_rps']:>9.2f} req/s  "
+        f"p50={summary['p50_ms']:.1f}ms p95={summary['p95_ms']:.1f}ms p99={summary['p99_ms']:.1f}ms"
+    )
+    return summary, responses
+
+
+# ---------------------------------------------------------
+# SCENARIO
+# ---------------------------------------------------------
+async def run_scenario(client: httpx.AsyncClient, args, corpus):
+    run_tag = f"{int(time.time())}{random.randint(0, 9999):04d}"
+    users = [
+        {"username": f"bench_{run_tag}_{i}", "email": f"bench_{run_tag}_{i}@example.com", "password": "bench-password"}
+        for i in range(args.users)
+    ]
+    phases = {}
+
+    def ok(response):
+        return response is not None and response.status_code < 400
+
+    phases["auth.register"], responses = await run_phase(
+        "auth.register",
+        [lambda u=u: client.post("/auth/users", json=u) for u in users],
+        args.concurrency,
+    )
+    for u, r in zip(users, responses):
+        u["verification_token"] = r.json().get("verification_token") if ok(r) else None
+
+    phases["auth.verify"], _ = await run_phase(
+        "auth.verify",
+        [
+            lambda u=u: client.post("/auth/verify/manual", params={"token": u["verification_token"]})
+            for u in users
+            if u["verification_token"]
+        ],
+        args.concurrency,
+    )
+
+    phases["auth.login"], responses = await run_phase(
+        "auth.login",
+        [
+            lambda u=u: client.post("/auth/token", data={"username": u["username"], "password": u["password"]})
+            for u in users
+        ],
+        args.concurrency,
+    )
+    for u, r in zip(users, responses):
+        u["headers"] = {"Authorization": f"Bearer {r.json()['access_token']}"} if ok(r) else None
+
+    users = [u for u in users if u["headers"]]
+    if not users:
+        raise SystemExit("No virtual user could log in; aborting.")
+
+    rng = random.Random(args.seed)
+    payloads = {u["username"]: to_csv(rng.choices(corpus, k=args.rows)) for u in users}
+
+    phases["files.upload"], responses = await run_phase(
+        "files.upload",
+        [
+            lambda u=u: client.post(
+                "/files",
+                headers=u["headers"],
+                files={"file": ("bench.csv", payloads[u["username"]], "text/csv")},
+            )
+            for u in users
+        ],
+        args.concurrency,
+    )
+    for u, r in zip(users, responses):
+        u["file_id"] = r.json().get("file_id") if ok(r) else None
+
+    # Unique text per request so the duplicate check never short-circuits.
+    phases["analyses.text"], _ = await run_phase(
+        "analyses.text",
+        [
+            lambda u=u, text=f"{corpus[(i * 7919 + n) % len(corpus)]} #{u['username']}-{n}": client.post(
+                "/analyses", headers=u["headers"], json={"text": text}
+            )
+            for i, u in enumerate(users)
+            for n in range(args.texts)
+        ],
+        args.concurrency,
+    )
+
+    phases["analyses.file"], _ = await run_phase(
+        "analyses.file",
+        [
+            lambda u=u: client.post(f"/analyses/file/{u['file_id']}", headers=u["headers"])
+            for u in users
+            if u["file_id"]
+        ],
+        args.concurrency,
+    )
+
+    return phases
+
+
+# ---------------------------------------------------------
+# REPORTING
+# ---------------------------------------------------------
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path: str, threshold_pct: float) -> bool:
+    """Print per-phase deltas against a previous run. Returns True on regression."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    regressed = False
+
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('git_revision')})")
+    for name, cur in current["phases"].items():
+        old = baseline["phases"].get(name)
+        if not old:
+            continue
+
+        rps_delta = (cur["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100 if old["throughput_rps"] else 0.0
+        p95_delta = (cur["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        flag = ""
+        if rps_delta < -threshold_pct or p95_delta > threshold_pct:
+            flag = "  <-- REGRESSION"
+            regressed = True
+
+        print(f"{name:<15} throughput {rps_delta:+7.1f}%   p95 {p95_delta:+7.1f}%{flag}")
+
+    return regressed
+
+
+async def main_async(args):
+    corpus = load_corpus(args.corpus) if args.corpus else make_corpus(args.corpus_size, args.seed)
+    stand_ins = None
+
+    if args.base_url:
+        target = args.base_url
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+            phases = await run_scenario(client, args, corpus)
+    else:
+        from benchmarks import standins
+
+        # every virtual user logs in from the same in-process "IP"
+        os.environ.setdefault("LOGIN_RATE_LIMIT_PER_IP", f"{max(30, args.users * 2)}/60")
+        stand_ins = standins.install(stub_model=not args.real_model)
+        from app.main import app
+
+        target = "in-process"
+        try:
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+                    phases = await run_scenario(client, args, corpus)
+        finally:
+            stand_ins["cleanup"]()
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": target,
+            "stub_model": stand_ins is not None and not args.real_model,
+            "emails_sent": len(stand_ins["emails"]) if stand_ins else None,
+            "args": vars(args),
+        },
+        "phases": phases,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=10, help="virtual users (default: 10)")
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight per phase (default: 8)")
+    parser.add_argument("--texts", type=int, default=20, help="POST /analyses requests per user (default: 20)")
+    parser.add_argument("--rows", type=int, default=200, help="rows per uploaded CSV (default: 200)")
+    parser.add_argument("--corpus", help="CSV file with a 'text' column to sample reviews from")
+    parser.add_argument("--corpus-size", type=int, default=2000, help="synthetic corpus size (default: 2000)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout in seconds")
+    parser.add_argument("--real-model", action="store_true", help="in-process only: load the real HF model instead of the stub")
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/api-<timestamp>.json)")
+    parser.add_argument("--compare", help="previous result JSON to diff against")
+    parser.add_argument("--regression-threshold", type=float, default=10.0, help="percent change that counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(main_async(args))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"api-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, default=str))
+    print(f"\nResults written to {output}")
+
+    if args.compare and compare(result, args.compare, args.regression_threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compression ratio vs CPU cost for the blob codecs in app/blob_service.py.
+
+Runs every codec / level over one or more review CSVs, chunk by chunk the
+way upload_bytes(..., compress=True) does, and reports the ratio and
+compress / decompress throughput:
+
+    python -m benchmarks.compression_bench --csv reviews.csv --csv export.csv
+    python -m benchmarks.compression_bench --rows 50000      # synthetic corpus
+
+Use real exports where possible: the synthetic corpus has a tiny vocabulary
+and compresses far better than actual reviews.
+"""
+import argparse
+import json
+import os
+import platform
+import time
+from datetime import datetime
+from pathlib import Path
+
+from app.blob_service import BLOB_CHUNK_SIZE, _compressor, _decompressor
+from benchmarks.api_bench import RESULTS_DIR, git_revision, make_corpus, to_csv
+
+DEFAULT_CODECS = ["gzip:1", "gzip:6", "gzip:9", "zstd:1", "zstd:3", "zstd:9", "zstd:19"]
+
+
+def compress(data: bytes, encoding: str, level: int, chunk_size: int) -> list:
+    compressor = _compressor(encoding, level)
+    view = memoryview(data)
+    chunks = [compressor.compress(view[i:i + chunk_size]) for i in range(0, len(view), chunk_size)]
+    chunks.append(compressor.flush())
+    return [c for c in chunks if c]
+
+
+def decompress(chunks: list, encoding: str) -> bytes:
+    decompressor = _decompressor(encoding)
+    out = [decompressor.decompress(c) for c in chunks]
+    out.append(decompressor.flush())
+    return b"".join(out)
+
+
+def run_codec(name: str, data: bytes, codec: str, chunk_size: int, repeat: int) -> dict:
+    encoding, _, level = codec.partition(":")
+    level = int(level) if level else None
+
+    compress_s, decompress_s = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = compress(data, encoding, level, chunk_size)
+        compress_s.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        restored = decompress(chunks, encoding)
+        decompress_s.append(time.perf_counter() - start)
+
+        if restored != data:
+            raise RuntimeError(f"{codec} round trip mismatch on {name}")
+
+    size = sum(len(c) for c in chunks)
+    mb = len(data) / 1e6
+    return {
+        "input": name,
+        "codec": codec,
+        "raw_bytes": len(data),
+        "stored_bytes": size,
+        "ratio": round(len(data) / size, 2) if size else None,
+        "compress_mb_s": round(mb / min(compress_s), 1),
+        "decompress_mb_s": round(mb / min(decompress_s), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", action="append", default=[], help="review CSV to compress (repeatable)")
+    parser.add_argument("--rows", type=int, default=20000, help="rows in the synthetic corpus when no --csv is given (default: 20000)")
+    parser.add_argument("--codecs", type=lambda v: v.split(","), default=DEFAULT_CODECS, help="comma separated encoding:level list")
+    parser.add_argument("--chunk-size", type=int, default=BLOB_CHUNK_SIZE, help="bytes per compress() call (default: BLOB_CHUNK_SIZE)")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N timings (default: 3)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/compression-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    inputs = [(path, Path(path).read_bytes()) for path in args.csv]
+    if not inputs:
+        inputs = [(f"synthetic-{args.rows}", to_csv(make_corpus(args.rows, args.seed)))]
+
+    runs = []
+    print(f"{'input':<24}{'codec':<9}{'raw MB':>9}{'ratio':>8}{'comp MB/s':>11}{'decomp MB/s':>13}")
+    for name, data in inputs:
+        for codec in args.codecs:
+            try:
+                r = run_codec(name, data, codec, args.chunk_size, args.repeat)
+            except ImportError as e:
+                print(f"{Path(name).name[:23]:<24}{codec:<9}  skipped ({e})")
+                continue
+            runs.append(r)
+            print(
+                f"{Path(name).name[:23]:<24}{codec:<9}{r['raw_bytes'] / 1e6:>9.2f}{r['ratio']:>8.2f}"
+                f"{r['compress_mb_s']:>11.1f}{r['decompress_mb_s']:>13.1f}"
+            )
+
+    result = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "runs": runs,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"compression-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Review extraction throughput: app/html_extract.py (lxml, one precompiled
+XPath per site) against the previous BeautifulSoup html.parser code (four
+soup.select passes per page, find_all(text=True) for generic pages).
+
+    python -m benchmarks.extract_bench                          # generated fixtures
+    python -m benchmarks.extract_bench --html amazon=page.html --html flipkart=saved.html
+    python -m benchmarks.extract_bench --save-fixtures /tmp/fixtures
+
+Generated fixtures imitate each site's markup with the review blocks buried
+in realistic amounts of navigation, scripts and product grids. Saved real
+pages give the numbers that matter; the site before "=" picks the profile
+("generic" runs the keyword search).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from app.html_extract import PROFILES, extract_generic, extract_page
+from benchmarks.api_bench import RESULTS_DIR, git_revision, make_corpus
+
+SITES = ["amazon", "flipkart", "bestbuy", "walmart", "generic"]
+
+REVIEW_MARKUP = {
+    "amazon": '<div class="a-section review"><span data-hook="review-body" class="a-size-base review-text review-text-content"><span>{}</span></span></div>',
+    "flipkart": '<div class="col"><div class="_6K-7Co">{}<span class="read">READ MORE</span></div></div>',
+    "bestbuy": '<li class="review-item"><div class="ugc-review-body"><p class="pre-white-space">{}</p></div></li>',
+    "walmart": '<div class="review"><span class="review-text">{}</span></div>',
+    "generic": '<div class="testimonial"><p>Customer review: {}</p></div>',
+}
+
+URLS = {
+    "amazon": "https://www.amazon.in/product-reviews/B000000000?pageNumber=1",
+    "flipkart": "https://www.flipkart.com/item/product-reviews/itm000?page=1",
+    "bestbuy": "https://www.bestbuy.com/site/reviews/sku/0000000",
+    "walmart": "https://www.walmart.com/reviews/product/000000",
+    "generic": None,
+}
+
+
+# ---------------------------------------------------------
+# FIXTURES
+# ---------------------------------------------------------
+def make_page(site: str, reviews: int, noise_blocks: int, seed: int) -> str:
+    rng = random.Random(seed)
+    texts = make_corpus(reviews + noise_blocks, seed)
+    parts = ["<!DOCTYPE html><html><head><title>Reviews</title>"]
+    parts += [f"<script>var cfg{i} = {json.dumps({'k': texts[i][:80]})};</script>" for i in range(20)]
+    parts.append("<style>.a{color:red}</style></head><body><nav>")
+    parts += [f'<a href="/c/{i}" class="nav-link">Category {i}</a>' for i in range(60)]
+    parts.append("</nav><main>")
+
+    # reviews spread evenly through the noise
+    step = max(noise_blocks // max(reviews, 1), 1)
+    placed = 0
+    for i in range(noise_blocks):
+        parts.append(
+            f'<div class="product-card s-{rng.randint(0, 9)}"><img src="/i/{i}.jpg" alt="">'
+            f'<h3><a href="/p/{i}">{texts[reviews + i][:40]}</a></h3>'
+            f'<span class="price">₹{rng.randint(100, 9999)}</span></div>'
+        )
+        if i % step == 0 and placed < reviews:
+            parts.append(REVIEW_MARKUP[site].format(texts[placed]))
+            placed += 1
+
+    parts += [REVIEW_MARKUP[site].format(texts[r]) for r in range(placed, reviews)]
+    if site == "amazon":
+        parts.append('<ul class="a-pagination"><li class="a-last"><a href="/product-reviews/B000000000?pageNumber=2">Next</a></li></ul>')
+    parts.append("</main><footer>" + "".join(f"<p>Footer link {i}</p>" for i in range(40)) + "</footer></body></html>")
+    return "".join(parts)
+
+
+# ---------------------------------------------------------
+# PREVIOUS IMPLEMENTATION (html.parser, one select per site)
+# ---------------------------------------------------------
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
+def soup_extract(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+    reviews = []
+    for selector in ["span[data-hook='review-body']", "div._6K-7Co", "p.pre-white-space", "span.review-text"]:
+        for r in soup.select(selector):
+            text = _clean(r.get_text().replace("READ MORE", ""))
+            if text:
+                reviews.append(text)
+    next_btn = soup.select_one("li.a-last a")
+    return list(dict.fromkeys(reviews)), next_btn["href"] if next_btn else None
+
+
+def soup_generic(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+    keywords = ["review", "comment", "feedback", "testimonial"]
+    found = []
+    for tag in soup.find_all(string=True):
+        if any(k in tag.lower() for k in keywords):
+            cleaned = _clean(tag)
+            if len(cleaned.split()) > 3:
+                found.append(cleaned)
+    return list(dict.fromkeys(found))
+
+
+# ---------------------------------------------------------
+# RUN
+# ---------------------------------------------------------
+def best_of(fn, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def run_page(name: str, site: str, html: str, repeat: int) -> dict:
+    if site == "generic":
+        old_s, old = best_of(lambda: soup_generic(html), repeat)
+        new_s, new = best_of(lambda: extract_generic(html), repeat)
+    else:
+        profile = PROFILES[site]
+        old_s, (old, _) = best_of(lambda: soup_extract(html), repeat)
+        new_s, (new, _) = best_of(lambda: extract_page(html, URLS.get(site), profile), repeat)
+
+    return {
+        "input": name,
+        "site": site,
+        "html_bytes": len(html.encode("utf-8")),
+        "reviews": len(new),
+        "same_reviews": set(old) == set(new),
+        "soup_ms": round(old_s * 1000, 2),
+        "lxml_ms": round(new_s * 1000, 2),
+        "speedup": round(old_s / new_s, 1) if new_s else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--html", action="append", default=[], help="site=path of a saved page (repeatable)")
+    parser.add_argument("--reviews", type=int, default=100, help="reviews per generated page (default: 100)")
+    parser.add_argument("--noise", type=int, default=1500, help="non-review blocks per generated page (default: 1500)")
+    parser.add_argument("--repeat", type=int, default=5, help="best of N timings (default: 5)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--save-fixtures", help="write the generated pages to this directory and exit")
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/extract-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    pages = []
+    for spec in args.html:
+        site, _, path = spec.rpartition("=")
+        site = site or Path(path).name.split("-")[0].split(".")[0]
+        if site not in SITES:
+            parser.error(f"unknown site {site!r} for {path} (one of {', '.join(SITES)})")
+        pages.append((path, site, Path(path).read_text(encoding="utf-8", errors="replace")))
+    if not pages:
+        pages = [(f"generated-{s}", s, make_page(s, args.reviews, args.noise, args.seed)) for s in SITES]
+
+    if args.save_fixtures:
+        out = Path(args.save_fixtures)
+        out.mkdir(parents=True, exist_ok=True)
+        for name, site, html in pages:
+            (out / f"{site}-{Path(name).stem}.html").write_text(html, encoding="utf-8")
+        print(f"Fixtures written to {out}")
+        return
+
+    runs = []
+    print(f"{'input':<22}{'site':<10}{'KB':>8}{'reviews':>9}{'same':>6}{'soup ms':>10}{'lxml ms':>10}{'speedup':>9}")
+    for name, site, html in pages:
+        r = run_page(name, site, html, args.repeat)
+        runs.append(r)
+        print(
+            f"{Path(name).name[:21]:<22}{site:<10}{r['html_bytes'] / 1024:>8.0f}{r['reviews']:>9}"
+            f"{'yes' if r['same_reviews'] else 'NO':>6}{r['soup_ms']:>10.2f}{r['lxml_ms']:>10.2f}{r['speedup']:>8.1f}x"
+        )
+
+    result = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "runs": runs,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"extract-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Build a tiny, randomly initialised XLM-R sentiment model and save it to disk
+so the sentiment benchmark (and the API) can run fully offline:
+
+    python -m benchmarks.make_tiny_model benchmarks/tiny-model
+    SENTIMENT_MODEL_NAME=benchmarks/tiny-model python -m benchmarks.sentiment_bench
+
+The model has the same architecture family, tokenizer type (slow
+sentencepiece XLMRobertaTokenizer) and label names as the production model,
+so it exercises the same code path in app/sentiment_service.py. Its
+predictions are meaningless; only its speed is of interest, and that scales
+with --hidden/--layers.
+"""
+import argparse
+import random
+import tempfile
+from pathlib import Path
+
+from benchmarks.api_bench import make_corpus
+
+
+def build(output: str, hidden: int, layers: int, heads: int, vocab: int, seed: int):
+    import sentencepiece as spm
+    from transformers import (
+        XLMRobertaConfig,
+        XLMRobertaForSequenceClassification,
+        XLMRobertaTokenizer,
+    )
+
+    random.seed(seed)
+    out = Path(output)
+    out.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = str(Path(tmp) / "spm")
+        spm.SentencePieceTrainer.train(
+            sentence_iterator=iter(make_corpus(5000, seed, min_words=3, max_words=40)),
+            model_prefix=prefix,
+            vocab_size=vocab,
+            model_type="unigram",
+            hard_vocab_limit=False,
+        )
+        tokenizer = XLMRobertaTokenizer(vocab_file=f"{prefix}.model")
+        tokenizer.save_pretrained(out)
+
+    config = XLMRobertaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden,
+        num_hidden_layers=layers,
+        num_attention_heads=heads,
+        intermediate_size=hidden * 4,
+        max_position_embeddings=514,
+        pad_token_id=tokenizer.pad_token_id,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        num_labels=3,
+        id2label={0: "negative", 1: "neutral", 2: "positive"},
+        label2id={"negative": 0, "neutral": 1, "positive": 2},
+    )
+    XLMRobertaForSequenceClassification(config).save_pretrained(out)
+
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", nargs="?", default="benchmarks/tiny-model")
+    parser.add_argument("--hidden", type=int, default=64)
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--heads", type=int, default=2)
+    parser.add_argument("--vocab", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    out = build(args.output, args.hidden, args.layers, args.heads, args.vocab, args.seed)
+    print(f"Tiny model saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
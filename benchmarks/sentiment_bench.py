@@ -0,0 +1,161 @@
+"""
+Micro-benchmark for app/sentiment_service.py.
+
+Sweeps batch size x input length (tokens) x torch intra-op threads x backend
+and reports texts/sec, per-batch latency and peak RSS for every combination.
+Each combination runs in a fresh spawned process so thread settings and the
+RSS high-water mark don't leak between runs.
+
+Backends:
+    pipeline   the HF pipeline exactly as the service builds it
+    int8       same pipeline with torch dynamic int8 quantisation of Linear layers
+
+Runs offline against a tiny local model:
+
+    python -m benchmarks.make_tiny_model benchmarks/tiny-model
+    python -m benchmarks.sentiment_bench --model benchmarks/tiny-model \\
+        --batch-sizes 1,8,32 --token-lengths 32,128,250 --threads 1,2,4
+
+Use --model cardiffnlp/twitter-xlm-roberta-base-sentiment (or leave it unset)
+to size nodes against the production model.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.api_bench import RESULTS_DIR, git_revision, make_corpus, percentile
+
+BACKENDS = ("pipeline", "int8")
+
+
+def _csv_ints(value: str):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _make_texts(tokenizer, token_length: int, count: int, seed: int):
+    texts = []
+    for i, base in enumerate(make_corpus(count, seed + token_length, min_words=token_length, max_words=token_length * 2)):
+        tokens = tokenizer.encode(base, add_special_tokens=False)[:token_length]
+        texts.append(tokenizer.decode(tokens, skip_special_tokens=True))
+    return texts
+
+
+def run_config(model: str, backend: str, threads: int, batch_size: int, token_length: int, texts: int, warmup: int, seed: int):
+    """Runs inside a spawned child process."""
+    os.environ["SENTIMENT_MODEL_NAME"] = model
+
+    import torch
+
+    torch.set_num_threads(threads)
+
+    from app import sentiment_service
+
+    load_start = time.perf_counter()
+    pipe = sentiment_service.get_model()
+    if backend == "int8":
+        pipe.model = torch.quantization.quantize_dynamic(pipe.model, {torch.nn.Linear}, dtype=torch.qint8)
+    load_s = time.perf_counter() - load_start
+
+    corpus = _make_texts(sentiment_service.tokenizer, token_length, texts, seed)
+
+    for _ in range(warmup):
+        sentiment_service.analyze_many(corpus[:batch_size], batch_size=batch_size)
+
+    batch_ms = []
+    start = time.perf_counter()
+    for i in range(0, len(corpus), batch_size):
+        t0 = time.perf_counter()
+        sentiment_service.analyze_many(corpus[i:i + batch_size], batch_size=batch_size)
+        batch_ms.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+
+    values = sorted(batch_ms)
+    return {
+        "backend": backend,
+        "threads": threads,
+        "batch_size": batch_size,
+        "token_length": token_length,
+        "texts": len(corpus),
+        "load_s": round(load_s, 3),
+        "texts_per_s": round(len(corpus) / elapsed, 2),
+        "batch_p50_ms": round(percentile(values, 50), 3),
+        "batch_p95_ms": round(percentile(values, 95), 3),
+        "batch_mean_ms": round(sum(values) / len(values), 3),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("SENTIMENT_MODEL_NAME"), help="hub id or local model dir (default: service default)")
+    parser.add_argument("--batch-sizes", type=_csv_ints, default=[1, 8, 32])
+    parser.add_argument("--token-lengths", type=_csv_ints, default=[32, 128, 250])
+    parser.add_argument("--threads", type=_csv_ints, default=[1, 2, 4])
+    parser.add_argument("--backends", type=lambda v: v.split(","), default=["pipeline"], help=f"comma separated, from {', '.join(BACKENDS)}")
+    parser.add_argument("--texts", type=int, default=64, help="texts scored per combination (default: 64)")
+    parser.add_argument("--warmup", type=int, default=2, help="warm-up batches per combination (default: 2)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/sentiment-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backend(s): {', '.join(sorted(unknown))}")
+
+    if not args.model:
+        from app.sentiment_service import MODEL_NAME
+
+        args.model = MODEL_NAME
+
+    ctx = mp.get_context("spawn")
+    runs = []
+
+    print(f"{'backend':<9}{'thr':>4}{'batch':>6}{'tokens':>7}{'texts/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'rss MB':>9}")
+    for backend, threads, batch_size, token_length in itertools.product(
+        args.backends, args.threads, args.batch_sizes, args.token_lengths
+    ):
+        with ctx.Pool(1, maxtasksperchild=1) as pool:
+            r = pool.apply(
+                run_config,
+                (args.model, backend, threads, batch_size, token_length, args.texts, args.warmup, args.seed),
+            )
+        runs.append(r)
+        print(
+            f"{r['backend']:<9}{r['threads']:>4}{r['batch_size']:>6}{r['token_length']:>7}"
+            f"{r['texts_per_s']:>10.1f}{r['batch_p50_ms']:>10.1f}{r['batch_p95_ms']:>10.1f}{r['peak_rss_mb']:>9.1f}"
+        )
+
+    result = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "runs": runs,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"sentiment-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
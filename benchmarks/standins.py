@@ -0,0 +1,101 @@
+"""
+Local stand-ins for the services the API talks to, so the whole app can be
+run and benchmarked offline:
+
+    Mongo        -> mongomock / mongomock-motor (in-process)
+    Azure Blob   -> the app's own local backend (BLOB_BACKEND=local)
+    Azure Email  -> the app's own sink backend (EMAIL_BACKEND=sink)
+    HF model     -> optional stub pipeline (no torch / no download)
+
+install() has to run BEFORE app.main (or any app.* module that imports the
+blob / email services) is imported.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import mongomock
+from mongomock_motor import AsyncMongoMockClient
+
+
+# ---------------------------------------------------------
+# HF PIPELINE → DETERMINISTIC STUB
+# ---------------------------------------------------------
+class StubTokenizer:
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+    def decode(self, tokens, skip_special_tokens=True):
+        return " ".join(tokens)
+
+
+class StubPipeline:
+    LABELS = ["negative", "neutral", "positive"]
+
+    def _one(self, text):
+        digest = hashlib.md5(text.encode("utf-8")).digest()
+        return {"label": self.LABELS[digest[0] % 3], "score": 0.5 + digest[1] / 512}
+
+    def __call__(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return [self._one(texts)]
+        return [self._one(t) for t in texts]
+
+
+def _create_indexes(self, indexes, session=None, **kwargs):
+    # mongomock's own create_indexes keeps only unique / sparse / name, which
+    # breaks the app's partial unique indexes; create_index keeps them all
+    return [
+        self.create_index(
+            list(model.document["key"].items()),
+            **{k: v for k, v in model.document.items() if k != "key"},
+        )
+        for model in indexes
+    ]
+
+
+def install(blob_root: str = None, stub_model: bool = True):
+    """
+    Wire the stand-ins into the app package. Returns a dict with handles the
+    harness can inspect (blob root, sent emails, mongo client) and a cleanup
+    callable for the temporary blob directory.
+    """
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+    owns_root = blob_root is None
+    blob_root = blob_root or tempfile.mkdtemp(prefix="bench-blobs-")
+
+    os.environ["BLOB_BACKEND"] = "local"
+    os.environ["BLOB_LOCAL_ROOT"] = blob_root
+
+    os.environ["EMAIL_BACKEND"] = "sink"
+    os.environ.setdefault("EMAIL_POLL_SECONDS", "0.2")
+
+    import app.database as database
+    import app.email_service as email_service
+
+    mongomock.collection.Collection.create_indexes = _create_indexes
+
+    # One in-memory store shared by the sync and the async client, so data
+    # written by an async handler is visible to a sync one and vice versa.
+    mongo = mongomock.MongoClient()
+    async_mongo = AsyncMongoMockClient(mock_mongo_client=mongo)
+    database.use_clients(mongo, async_mongo)
+
+    if stub_model:
+        import app.sentiment_service as sentiment_service
+
+        sentiment_service.sentiment_model = StubPipeline()
+        sentiment_service.tokenizer = StubTokenizer()
+
+    def cleanup():
+        if owns_root:
+            shutil.rmtree(blob_root, ignore_errors=True)
+
+    return {
+        "blob_root": blob_root,
+        "emails": email_service.sent_messages,
+        "mongo": mongo,
+        "cleanup": cleanup,
+    }
@@ -0,0 +1,66 @@
+"""
+Import-time budget for the API: `import app.main` must stay cheap, because
+every worker pays it on boot, scale-out and recycle.
+
+    python -m pytest test_import_time.py
+    python test_import_time.py            # prints the slowest imports
+
+IMPORT_TIME_BUDGET_MS overrides the budget (cumulative time of app.main as
+reported by `python -X importtime`).
+"""
+import os
+import subprocess
+import sys
+
+BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "2000"))
+
+# Only needed by a few routes: imported inside the functions that use them
+DEFERRED = [
+    "pandas",
+    "matplotlib",
+    "openpyxl",
+    "transformers",
+    "torch",
+    "selenium",
+    "webdriver_manager",
+    "motor",
+    "azure.storage.blob",
+    "azure.communication.email",
+]
+
+
+def import_times(module: str = "app.main") -> dict:
+    """{module: cumulative microseconds} from a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_heavy_modules_are_deferred():
+    imported = import_times()
+    eager = [m for m in DEFERRED if m in imported]
+    assert not eager, f"imported while loading app.main: {eager}"
+
+
+def test_app_import_within_budget():
+    elapsed_ms = import_times()["app.main"] / 1000
+    assert elapsed_ms <= BUDGET_MS, f"import app.main took {elapsed_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)"
+
+
+if __name__ == "__main__":
+    times = import_times()
+    for name, us in sorted(times.items(), key=lambda t: t[1], reverse=True)[:25]:
+        print(f"{us / 1000:>9.1f} ms  {name}")